@@ -0,0 +1,52 @@
+#!/usr/bin/env python3.9
+# -*- coding: utf-8 -*-
+
+# Compare the compiled content filter against the old
+# per-filter scan, at a few different filter list sizes
+# (below objects.filters.SCAN_MAX, it does the same scan).
+# usage: python3.9 bench/filters.py
+
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from objects.filters import SCAN_MAX
+from objects.filters import ContentFilter
+
+def naive(msg: str, words: set[str], substrings: set[str]) -> bool:
+    return (any(f in msg for f in substrings) or
+            any(s in words for s in msg.split(' ')))
+
+def rand_word(lo: int = 4, hi: int = 10) -> str:
+    return ''.join(random.choices(string.ascii_lowercase, k=random.randint(lo, hi)))
+
+def main() -> None:
+    random.seed(0)
+    msgs = [' '.join(rand_word(2, 8) for _ in range(random.randint(3, 20)))
+            for _ in range(1000)]
+
+    print(f'{"patterns":>9} | {"naive (us/msg)":>14} | {"compiled (us/msg)":>17} | {"build (ms)":>10}')
+
+    for n in (10, 100, SCAN_MAX, 1_000, 10_000):
+        words = {rand_word() for _ in range(n // 2)}
+        substrings = {rand_word(5, 12) for _ in range(n // 2)}
+
+        t = timeit.default_timer()
+        compiled = ContentFilter(words, substrings)
+        build = (timeit.default_timer() - t) * 1000
+
+        assert all(compiled.search(m) == naive(m, words, substrings) for m in msgs)
+
+        rounds = max(1, 10_000 // n)
+        t_naive = timeit.timeit(lambda: [naive(m, words, substrings) for m in msgs], number=rounds)
+        t_compiled = timeit.timeit(lambda: [compiled.search(m) for m in msgs], number=rounds)
+
+        per_msg = lambda t: t / (rounds * len(msgs)) * 1e6
+        print(f'{n:>9,} | {per_msg(t_naive):>14.2f} | {per_msg(t_compiled):>17.2f} | {build:>10.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3.9
+# -*- coding: utf-8 -*-
+
+# Check the streaming .osu metadata parser against reference values for
+# a directory of maps (by default, the ones aika has downloaded, named by
+# md5), and time it against a straightforward full parse. The reference
+# values are in metadata.json alongside the maps, by file name; run with
+# --fetch <osu!api key> to fetch any missing from the osu!api (for maps
+# named by md5). bench/fixtures/' maps aren't on the osu!api, so theirs
+# are oppai-ng's max combos, with lengths & bpms worked out by hand (as
+# tests/test_osufile.py also checks).
+# usage: python3.9 bench/osufile.py [maps dir] [--fetch key]
+
+import argparse
+import bisect
+import json
+import math
+import os
+import sys
+import timeit
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from objects.osufile import parse_metadata
+
+def full_parse(content: bytes):
+    sections = {}
+    section = None
+
+    for line in content.decode(errors='replace').splitlines():
+        if not (line := line.strip()) or line.startswith('//'):
+            continue
+
+        if line.startswith('['):
+            section = sections[line[1:-1]] = []
+        elif section is not None:
+            section.append(line)
+
+    kv = lambda s: dict(l.split(':', 1) for l in sections.get(s, []) if ':' in l)
+    general, diff = kv('General'), kv('Difficulty')
+
+    if (mode := int(general.get('Mode', 0))) not in (0, 1):
+        return
+
+    timing = sorted(
+        [(float(p[0]), float(p[1])) for p in
+         (l.split(',') for l in sections['TimingPoints'])],
+        key=lambda tp: tp[0]
+    )
+    objects = [l.split(',') for l in sections['HitObjects']]
+    breaks = sum(float(e[2]) - float(e[1]) for e in
+                 (l.split(',') for l in sections['Events'])
+                 if e[0] in ('2', 'Break'))
+
+    slider_mult = float(diff.get('SliderMultiplier', 1.4))
+    tick_rate = float(diff.get('SliderTickRate', 1))
+
+    # (beat length, sv) from each timing point onwards.
+    times = [t for t, _ in timing]
+    states = []
+    beat_len, sv = next(bl for _, bl in timing if bl > 0), 1.0
+    for _, bl in timing:
+        if bl > 0:
+            beat_len, sv = bl, 1.0
+        else:
+            sv = min(10.0, max(0.1, -100.0 / bl))
+        states.append((beat_len, sv))
+
+    combo = 0
+    ends = []
+    for obj in objects:
+        time, obj_type = float(obj[2]), int(obj[3])
+
+        if i := bisect.bisect_right(times, time):
+            beat_len, sv = states[i - 1]
+        else:
+            beat_len, sv = next(bl for _, bl in timing if bl > 0), 1.0
+
+        if obj_type & 2:
+            slides, length = int(obj[6]), float(obj[7])
+            beats = length * slides / (slider_mult * 100.0 * sv)
+            ends.append(time + beats * beat_len)
+            if mode == 0:
+                ticks = math.ceil((beats - 0.1) / slides * tick_rate) - 1
+                combo += max(0, ticks) * slides + slides + 1
+        elif obj_type & 8:
+            ends.append(float(obj[5]))
+            combo += mode == 0
+        else:
+            ends.append(time)
+            combo += 1
+
+    return combo, int((max(ends) - float(objects[0][2]) - breaks) // 1000)
+
+def load_expected(path: str, md5s: list[str], key: str) -> dict[str, dict]:
+    """Load the reference values for the maps, fetching any
+    missing from the osu!api if we've been given a key."""
+    api_path = os.path.join(path, 'metadata.json')
+
+    saved = {}
+    if os.path.exists(api_path):
+        with open(api_path) as f:
+            saved = json.load(f)
+
+    if key and (missing := [md5 for md5 in md5s if md5 not in saved]):
+        print(f'Fetching {len(missing)} maps from the osu!api..')
+
+        for md5 in missing:
+            query = urllib.parse.urlencode({'k': key, 'h': md5})
+            with urllib.request.urlopen(f'https://old.ppy.sh/api/get_beatmaps?{query}') as resp:
+                res = json.load(resp)
+
+            if res:
+                saved[md5] = {'max_combo': int(res[0]['max_combo'] or 0),
+                              'hit_length': int(res[0]['hit_length']),
+                              'bpm': float(res[0]['bpm'])}
+
+        with open(api_path, 'w') as f:
+            json.dump(saved, f, indent=2)
+
+    return saved
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', default='.data/maps')
+    parser.add_argument('--fetch', metavar='key', help='osu!api key')
+    args = parser.parse_args()
+
+    files = sorted(f for f in os.listdir(args.path) if f.endswith('.osu'))
+
+    if not files:
+        print(f'No .osu files found in {args.path}.')
+        return
+
+    corpus = {}
+    for f in files:
+        with open(os.path.join(args.path, f), 'rb') as fp:
+            corpus[f[:-4]] = fp.read()
+
+    expected = load_expected(args.path, list(corpus), args.fetch)
+    parsed = {md5: parse_metadata(c) for md5, c in corpus.items()}
+
+    # compare against the reference values, where we have both.
+    checked = 0
+    mismatches = []
+    for md5, meta in parsed.items():
+        if not meta or not (api := expected.get(md5)):
+            continue
+
+        checked += 1
+        for field in ('max_combo', 'hit_length'):
+            if meta[field] != api[field]:
+                mismatches.append((md5, field, meta[field], api[field]))
+
+        # the osu!api's bpm may be rounded differently.
+        if abs(meta['bpm'] - api['bpm']) > max(1.0, api['bpm'] * 0.01):
+            mismatches.append((md5, 'bpm', meta['bpm'], api['bpm']))
+
+    size = sum(map(len, corpus.values())) / 1024 / 1024
+    print(f'{len(corpus)} maps ({size:.1f}MB), {sum(map(bool, parsed.values()))} parsed, '
+          f'{checked} checked against reference values')
+
+    for md5, field, ours, theirs in mismatches[:20]:
+        print(f'  {md5}: {field} {ours} != {theirs}')
+
+    if mismatches:
+        print(f'{len(mismatches)} mismatches.')
+
+    contents = list(corpus.values())
+    for name, func in (('streaming', parse_metadata), ('full parse', full_parse)):
+        t = min(timeit.repeat(lambda: [func(c) for c in contents], number=1, repeat=5))
+        print(f'{name:>10} | {t / len(contents) * 1e6:9,.1f}us/map | {size / t:6.1f}MB/s')
+
+    if mismatches or not checked:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
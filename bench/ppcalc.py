@@ -0,0 +1,198 @@
+#!/usr/bin/env python3.9
+# -*- coding: utf-8 -*-
+
+# Check the pp calculation engines' results against oppai-ng 4.1.0's,
+# for the maps in bench/fixtures/ (oppai.json has its star ratings, max
+# combos & pp for 95% & 100% fcs), then compare their speed over a
+# directory of .osu files (by default, the ones aika has downloaded)
+# for each mode & a few mod combinations; results there are compared
+# against a reference engine, if it can be loaded. Engines which can't
+# be loaded here are skipped. Exits non-zero if any engine is wrong.
+# usage: python3.9 bench/ppcalc.py [maps dir] [--ref oppai]
+#        [--engines oppai,python] [--lib oppai-ng/liboppai.so]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cmyui.osu.mods import Mods
+
+from objects.engines import ENGINES
+from objects.pp import calc_pp
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+MODS = {
+    'NM': 0,
+    'HR': Mods.HARDROCK,
+    'DT': Mods.DOUBLETIME,
+    'HDHR': Mods.HIDDEN | Mods.HARDROCK
+}
+
+ACCS = (95.0, 100.0)
+
+def rel_error(value: float, expected: float) -> float:
+    return abs(value - expected) / expected if expected else abs(value)
+
+def check_fixtures(engines: dict, tolerance: float) -> bool:
+    """Compare each engine against oppai-ng's results for the fixtures."""
+    with open(os.path.join(FIXTURES, 'oppai.json')) as f:
+        cases = json.load(f)
+
+    maps = {}
+    for case in cases:
+        if case['map'] not in maps:
+            with open(os.path.join(FIXTURES, case['map']), 'rb') as f:
+                maps[case['map']] = f.read()
+
+    print(f'{len(cases)} fixtures ({len(maps)} maps), against oppai-ng 4.1.0.')
+    print(f'{"engine":>8} | {"fails":>5} | {"combo":>5} | '
+          f'{"sr err (mean/max)":>17} | {"pp err (mean/max)":>17} | ok')
+
+    all_ok = True
+
+    for name, engine in engines.items():
+        sr_errs, pp_errs = [], []
+        fails = bad_combos = 0
+
+        for case in cases:
+            if case['mode'] not in engine.modes:
+                continue
+
+            try:
+                attrs = engine.difficulty(maps[case['map']], case['mode'], case['mods'])
+            except Exception:
+                fails += 1
+                continue
+
+            bad_combos += attrs.max_combo != case['max_combo']
+            sr_errs.append(rel_error(attrs.sr, case['sr']))
+            pp_errs.extend(
+                rel_error(calc_pp(attrs, case['mods'], acc), case[f'pp_{acc:.0f}'])
+                for acc in ACCS
+            )
+
+        if not sr_errs:
+            print(f'{name:>8} | {fails:5} | {bad_combos:5} | no results')
+            all_ok = False
+            continue
+
+        ok = not (fails or bad_combos) and max(max(sr_errs), max(pp_errs)) <= tolerance
+        all_ok &= ok
+
+        print(f'{name:>8} | {fails:5} | {bad_combos:5} | '
+              f'{sum(sr_errs) / len(sr_errs):7.2%} / {max(sr_errs):7.2%} | '
+              f'{sum(pp_errs) / len(pp_errs):7.2%} / {max(pp_errs):7.2%} | '
+              f'{"yes" if ok else "no"}')
+
+    return all_ok
+
+def bench_corpus(engines: dict, corpus: list[bytes], ref: str) -> None:
+    """Time each engine over the corpus, comparing results against `ref`."""
+    compare = ref in engines
+    print(f'\n{len(corpus)} maps' + (f', compared against {ref}.' if compare else '.'))
+
+    for mode in (0, 1):
+        print(f'\nmode {mode}')
+        print(f'{"engine":>8} | {"ms/map":>8} | {"fails":>5} | '
+              f'{"sr err (mean/max)":>17} | {"pp err (mean/max)":>17}')
+
+        # {engine: {(mods, map idx): attrs}}
+        results = {}
+        timings = {}
+
+        for name, engine in engines.items():
+            if mode not in engine.modes:
+                continue
+
+            results[name] = {}
+            start = time.perf_counter()
+
+            for mods in MODS.values():
+                for idx, content in enumerate(corpus):
+                    try:
+                        attrs = engine.difficulty(content, mode, mods)
+                    except Exception:
+                        pass
+                    else:
+                        results[name][(mods, idx)] = attrs
+
+            timings[name] = (time.perf_counter() - start) / (len(corpus) * len(MODS))
+
+        # without a reference, count maps nothing could calculate
+        # (e.g. taiko maps in mode 0) as expected, not failures.
+        if compare:
+            expected = results[ref]
+        else:
+            expected = {key: None for res in results.values() for key in res}
+
+        for name, res in results.items():
+            sr_errs, pp_errs = [], []
+            fails = 0
+
+            for key, ref_attrs in expected.items():
+                if (attrs := res.get(key)) is None:
+                    fails += 1
+                    continue
+
+                if ref_attrs is None:
+                    continue
+
+                mods = key[0]
+                sr_errs.append(rel_error(attrs.sr, ref_attrs.sr))
+                pp_errs.extend(
+                    rel_error(calc_pp(attrs, mods, acc), calc_pp(ref_attrs, mods, acc))
+                    for acc in ACCS
+                )
+
+            if not sr_errs:
+                print(f'{name:>8} | {timings[name] * 1000:8.2f} | {fails:5} |')
+                continue
+
+            print(f'{name:>8} | {timings[name] * 1000:8.2f} | {fails:5} | '
+                  f'{sum(sr_errs) / len(sr_errs):7.2%} / {max(sr_errs):7.2%} | '
+                  f'{sum(pp_errs) / len(pp_errs):7.2%} / {max(pp_errs):7.2%}')
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', default='.data/maps')
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--ref', default='oppai')
+    parser.add_argument('--lib', default='oppai-ng/liboppai.so')
+    parser.add_argument('--tolerance', type=float, default=0.005,
+                        help='max relative error vs. oppai-ng to be "ok"')
+    args = parser.parse_args()
+
+    engines = {}
+    for name in args.engines.split(','):
+        try:
+            kwargs = {'lib_path': args.lib} if name == 'oppai' else {}
+            engines[name] = ENGINES[name](**kwargs)
+        except Exception as e:
+            print(f'Skipping {name} ({e}).')
+
+    if not engines:
+        print('No engines available.')
+        sys.exit(1)
+
+    ok = check_fixtures(engines, args.tolerance)
+
+    if os.path.isdir(args.path):
+        corpus = []
+        for f in os.listdir(args.path):
+            if f.endswith('.osu'):
+                with open(os.path.join(args.path, f), 'rb') as fp:
+                    corpus.append(fp.read())
+
+        if corpus:
+            bench_corpus(engines, corpus, args.ref)
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
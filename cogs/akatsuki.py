@@ -6,10 +6,8 @@
 # i'm witing it for my own use case.
 
 import asyncio
-import random
-import os
 import time
-from collections import defaultdict
+import traceback
 from datetime import datetime as dt
 from datetime import timezone as tz
 from typing import Optional
@@ -19,23 +17,38 @@ import discord
 from cmyui.logging import Ansi
 from cmyui.logging import log
 from cmyui.osu.mods import Mods
-from cmyui.osu.oppai_ng import OppaiWrapper
 from discord.ext import commands
 from discord.ext import tasks
 
-from constants import regexes
 from objects.aika import Aika
 from objects.aika import ContextWrap
 from objects.aika import Leaderboard
+from objects.beatmaps import BeatmapCache
+from objects.beatmaps import BeatmapFileStore
+from objects.links import LinkIndex
+from objects.cache import SingleFlight
+from objects.difficulty import DifficultyAttrs
+from objects.difficulty import difficulty_mods
+from objects.pp import CalcResult
+from objects.pp import DiffJob
+from objects.pp import DifficultyStore
+from objects.pp import PPCalculator
+from objects.pp import calc_pp
+from objects.profiles import ProfileCache
+from objects.profiles import safe_name
+from objects.renders import RenderCache
+from objects.rolesync import RoleSync
+from objects.scorewatch import ScoreWatcher
 from utils import accuracy_grade
 from utils import akatsuki_only
 from utils import calc_accuracy_std
 from utils import calc_accuracy_taiko
 from utils import gamemode_readable
+from utils import mods_from_str
 from utils import seconds_readable
-from utils import seconds_readable_full
 from utils import status_readable
 from utils import truncate
+from utils import try_parse_float
 
 FAQ = dict[str, Union[int, str]]
 
@@ -44,6 +57,40 @@ class Akatsuki(commands.Cog):
         self.bot = bot
         self._faq = None
 
+        # .osu files, stored on disk by md5.
+        self.osu_files = BeatmapFileStore(
+            self.bot, budget = self.bot.config.osu_file_budget)
+
+        # beatmap metadata, cached by md5.
+        self.beatmaps = BeatmapCache(self.bot, self.osu_files)
+        self.bot.cache['beatmaps'] = self.beatmaps
+
+        # difficulty calculation, in worker processes; the
+        # attributes are stored per map & difficulty mods,
+        # and pp for any play is calculated from them.
+        self.pp_calc = PPCalculator(**self.bot.config.pp_calc)
+        self.difficulty = DifficultyStore(self.bot.db, self.pp_calc.engines)
+        self.difficulty_calcs = SingleFlight()
+        self.bot.cache['difficulty'] = self.difficulty
+
+        # discord <-> akatsuki account links, loaded on startup.
+        self.links = LinkIndex(self.bot.db)
+        self.refresh_links.start()
+
+        # notable new scores set by linked users.
+        self.score_watcher = ScoreWatcher(self.bot.db)
+
+        # supporter & premium roles, kept in line with privileges.
+        self.role_sync = RoleSync()
+
+        # akatsuki profiles & clan tags.
+        self.profiles = ProfileCache(self.bot.db)
+        self.bot.cache['profiles'] = self.profiles
+
+        # rendered !top & !recent embeds, until the user sets a new score.
+        self.renders = RenderCache(self.bot.db)
+        self.bot.cache['renders'] = self.renders
+
         loop = asyncio.get_event_loop()
         loop.create_task(self.load_faq())
 
@@ -52,9 +99,17 @@ class Akatsuki(commands.Cog):
             # we're on the Akatsuki server.
             self.manage_roles.start()
 
+            if self.bot.config.akatsuki['channels'].get('new_scores'):
+                self.watch_scores.start()
+
     def cog_unload(self) -> None:
+        self.refresh_links.cancel()
+
         if self.bot.config.server_build:
             self.manage_roles.cancel()
+            self.watch_scores.cancel()
+
+        self.pp_calc.shutdown()
 
     #################
     ### Listeners ###
@@ -121,27 +176,59 @@ class Akatsuki(commands.Cog):
     ############
 
     async def get_osu(self, discordID: int) -> Optional[dict[str, Union[int, str]]]:
-        res = await self.bot.db.fetch(
-            'SELECT a.osu_id id, u.username name, u.privileges priv '
-            'FROM aika_akatsuki a LEFT JOIN users u ON u.id = a.osu_id '
-            'WHERE a.discordid = %s', [discordID]
-        )
+        await self.links.ready.wait()
 
-        if res and res['id']:
-            return res
+        if osuID := self.links.osu_id(discordID):
+            return await self.profiles.get(osuID)
 
     async def get_osu_from_name(self, username: str) -> Optional[dict[str, Union[int, str]]]:
-        return await self.bot.db.fetch(
-            'SELECT id, username name, privileges priv '
-            'FROM users WHERE username = %s',
-            [username]
-        )
+        return await self.profiles.get_by_name(username)
+
+    async def get_difficulty(self, md5: str, bid: int, mode: int,
+                             mods: int) -> Optional[DifficultyAttrs]:
+        # attributes are stored, so most of the
+        # time we won't even need the .osu file.
+        if attrs := await self.difficulty.get(md5, mode, mods):
+            return attrs
+
+        # concurrent misses for the same map & mods
+        # (say, a few !top's) share one calculation.
+        mods = difficulty_mods(mods)
+        return await self.difficulty_calcs.do(
+            (md5, mode, mods), self._calc_difficulty, md5, bid, mode, mods)
+
+    async def _calc_difficulty(self, md5: str, bid: int, mode: int,
+                               mods: int) -> Optional[DifficultyAttrs]:
+        if not (content := await self.osu_files.get(md5, bid)):
+            return
 
-    @commands.command(aliases=['t'])
-    @commands.guild_only()
-    async def top(self, ctx: ContextWrap) -> None:
-        msg = ctx.message.content.split(' ')[1:]
+        attrs, = await self.pp_calc.calculate([DiffJob(content, mode, mods)])
+
+        if attrs:
+            await self.difficulty.set(md5, mode, mods, attrs)
+
+        return attrs
 
+    async def calc_fc(self, md5: str, bid: int, mode: int,
+                      mods: int, acc: float) -> Optional[CalcResult]:
+        if not (attrs := await self.get_difficulty(md5, bid, mode, mods)):
+            return
+
+        return CalcResult(calc_pp(attrs, mods, acc), attrs.sr, attrs.ar, attrs.od)
+
+    @staticmethod
+    def display_name(user: dict[str, Union[int, str]]) -> str:
+        """The user's name, with their clan tag if they have one."""
+        if user['clan']:
+            return f"[{user['clan']}] {user['name']}"
+        else:
+            return user['name']
+
+    @staticmethod
+    def parse_score_args(msg: list[str]) -> tuple[bool, Optional[int]]:
+        """Remove & parse the -rx & -gm flags from a !top/!recent
+        command's arguments, returning (rx, gm); gm is None if the
+        flag was present but invalid."""
         if (rx := '-rx' in msg):
             # relax flag specified in command
             msg.remove('-rx')
@@ -154,384 +241,318 @@ class Akatsuki(commands.Cog):
             msg.remove('-gm')
 
             # ensure the gm is present and is decimal
-            if len(msg) < idx or not msg[idx].isdecimal():
-                await ctx.send(
-                    'Invalid syntax: `!top <-gm #> <-rx> <username/@mentions ...>`.')
-                return
+            if len(msg) <= idx or not msg[idx].isdecimal():
+                return rx, None
 
             # get the gm flag, make sure it's in valid range
             gm = int(msg.pop(idx))
             if gm not in range(2):
-                await ctx.send(
-                    'Invalid gamemode (only osu! & osu!taiko supported).')
-                return
+                return rx, None
 
         else:
             # no gamemode flag specified, default to osu!standard
             gm = 0
 
+        return rx, gm
+
+    async def get_score_users(self, ctx: ContextWrap,
+                              msg: list[str]) -> Optional[list[dict[str, Union[int, str]]]]:
+        """Resolve the users a !top/!recent command is for, sending
+        an error & returning None if they're not all available."""
         if not msg:
             # no mentions or username specified, check for akatsuki link
             users = [await self.get_osu(ctx.author.id)]
         else:
             # either mention or username provided
             if mentions := ctx.message.mentions:
-                users = [await self.get_osu(m.id) for m in mentions]
+                if len(mentions) > 3:
+                    await ctx.send('No more than 3 users may be requested at a time!')
+                    return
+
+                await self.links.ready.wait()
+                osuIDs = [self.links.osu_id(m.id) for m in mentions]
+                profiles = await self.profiles.get_many(filter(None, osuIDs))
+                users = [profiles.get(osuID) for osuID in osuIDs]
             else:
-                # XXX: while simple, this only allows a single name..
-                users = [await self.get_osu_from_name(' '.join(msg))]
+                # one or more names, separated by commas.
+                names = [n for n in ' '.join(msg).split(',') if n.strip()]
+                if len(names) > 3:
+                    await ctx.send('No more than 3 users may be requested at a time!')
+                    return
+
+                profiles = await self.profiles.get_many_by_name(names)
+
+                if missing := [n.strip() for n in names if safe_name(n) not in profiles]:
+                    await ctx.send(f"Could not find {', '.join(missing)}.")
+                    return
+
+                users = [profiles[safe_name(n)] for n in names]
 
         if not all(users):
-            return await ctx.send('Could not find all users specified.')
+            await ctx.send('Could not find all users specified.')
+            return
 
         # only allow bot owner to fetch restricted users
-        if not all(u['priv'] & 1 for u in users) \
-        and not await self.bot.is_owner(ctx.author):
-            return await ctx.send('You have insufficient privileges.')
-
-        if len(users) > 3:
-            return await ctx.send(
-                'No more than 3 users may be requested at a time!')
-
-        for user in users:
-            table = 'scores_relax' if rx else 'scores'
-            if not (res := await self.bot.db.fetchall(
-                'SELECT s.score, s.pp, s.accuracy acc, s.max_combo s_combo, '
-                's.mods, s.300_count n300, s.100_count n100, s.beatmap_md5, '
-                's.50_count n50, s.misses_count nmiss, s.time, s.completed, '
-
-                'b.song_name sn, b.beatmap_id bid, b.beatmapset_id bsid, b.bpm, '
-                'b.ar, b.od, b.max_combo as b_combo, b.hit_length, b.ranked '
-
-                f'FROM {table} s '
-                'LEFT JOIN beatmaps b USING(beatmap_md5) '
-                'WHERE s.userid = %s AND b.ranked IN (2, 3) '
-                'AND s.play_mode = %s AND s.completed = 3 '
-                'ORDER BY s.pp DESC LIMIT 3',
-                [user['id'], gm]
-            )): return await ctx.send('The user has no scores!')
-
-            e = discord.Embed(colour = self.bot.config.embed_colour)
-
-            clan = await self.bot.db.fetch(
-                'SELECT c.tag FROM users u '
-                'LEFT JOIN clans c ON c.id = u.clan_id '
-                'WHERE u.id = %s', [user['id']]
-            )
+        if (
+            not all(u['priv'] & 1 for u in users) and
+            not await self.bot.is_owner(ctx.author)
+        ):
+            await ctx.send('You have insufficient privileges.')
+            return
 
-            if clan and clan['tag']:
-                _name = f"[{clan['tag']}] {user['name']}"
+        return users
+
+    async def send_score_embeds(self, ctx: ContextWrap, users: list[dict],
+                                results: list[Union[discord.Embed, str, BaseException]],
+                                start: float) -> None:
+        """Send each user's rendered embed (or error), in the order the
+        users were requested, with the command's total latency."""
+        elapsed = time.perf_counter() - start
+
+        for user, res in zip(users, results):
+            if isinstance(res, BaseException):
+                log(f"Failed to render {ctx.invoked_with} for {user['name']} ({res!r}).", Ansi.LRED)
+                await ctx.send(f"Failed to get {user['name']}'s scores.")
+            elif isinstance(res, str):
+                await ctx.send(res)
             else:
-                _name = user['name']
+                footer = [f'Aika v{self.bot.version}', f'{elapsed:.2f}s']
+                if res.footer.text:
+                    footer.append(res.footer.text)
 
-            plural = lambda s: f"{s}'s" if s[-1] != 's' else f"{s}'"
+                res.set_footer(text = ' | '.join(footer))
+                await ctx.send(embed = res)
 
-            e.set_author(
-                name = f"{plural(_name)} top 3 {gamemode_readable(gm)} plays.",
-                url = f"https://akatsuki.pw/u/{user['id']}?mode={gm}&rx={int(rx)}",
-                icon_url = f"https://a.akatsuki.pw/{user['id']}"
-            )
-
-            # Store the score embed strings as a list initially since we
-            # actually want to print the whole embed in a single block.
-            # We'll eventually join them all by newlines into the
-            scores = []
-            for idx, row in enumerate(res):
-                # XXX:HACK: we certainly don't need to do an api request *every* time.
-                # we should be updating the info in the db and have a ttl for it
-                async with self.bot.http_sess.get(
-                    'https://old.ppy.sh/api/get_beatmaps',
-                    params={
-                        'h': row['beatmap_md5'],
-                        'k': random.choice(self.bot.config.osu_api_keys),
-                    },
-                ) as req:
-                    map_info = await req.json(content_type=None)
-
-                    if not map_info or req.status != 200:
-                        await ctx.send('Error getting map.')
-                        return
-
-                    map_info = map_info[0]
-
-                    row['hit_length'] = int(map_info['hit_length'])
-                    row['bpm'] = float(map_info['bpm'])
-                    row['b_combo'] = int(map_info['max_combo'])
-                    row['sn'] = f"{map_info['artist']} - {map_info['title']} [{map_info['version']}]"
-                    row['bid'] = int(map_info['beatmap_id'])
-
-                # Iterate through scores, adding them to `scores`.
-                if row['mods'] & (Mods.DOUBLETIME | Mods.NIGHTCORE):
-                    row['hit_length'] = int(row['hit_length'] / 1.5)
-                    row['bpm'] = int(row['bpm'] * 1.5)
-                elif row['mods'] & Mods.HALFTIME:
-                    row['hit_length'] = int(row['hit_length'] * 1.5)
-                    row['bpm'] = int(row['bpm'] / 1.5)
-
-                # Length and ranked status as formatted strings
-                row['length'] = seconds_readable(row['hit_length'])
-                row['ranked'] = status_readable(row['ranked'])
-
-                # Letter grade
-                # This is done.. stragely
-                # TODO: don't do strangely?
-                row['grade'] = self.bot.get_emoji(
-                    self.bot.config.akatsuki['grade_emojis'][
-                        accuracy_grade(
-                            gm, row['acc'], row['mods'],
-                            row['n300'], row['n100'], row['n50'],
-                            row['nmiss']) if row['completed'] != 0 else 'F'
-                    ])
-
-                # "fc" is atleast 98% of fc combo + no misses
-                is_fc = (row['s_combo'] > int(row['b_combo'] * 0.98) and
-                         row['nmiss'] == 0)
-
-                if is_fc:
-                    fcAcc = row['acc']
-                else:
-                    fcAcc = (calc_accuracy_std(
-                        n300 = row['n300'],
-                        n100 = row['n100'],
-                        n50 = row['n50'],
-                        nmiss = 0) if gm == 0 \
-                    else calc_accuracy_taiko(
-                        n300 = row['n300'],
-                        n150 = row['n100'], # lol
-                        nmiss = 0)) * 100.0
-
-                bmap_id = row['bid']
-                filepath = f".data/maps/{bmap_id}.osu"
-                if not os.path.exists(filepath):
-                    # file not on disk, download from osu!api
-                    async with self.bot.http_sess.get(f'https://old.ppy.sh/osu/{bmap_id}') as resp:
-                        if not resp or resp.status != 200:
-                            log(f'Failed to get .osu file for {bmap_id}', Ansi.LRED)
-                            await ctx.send('Failed to find .osu file.')
-                            return
-
-                        with open(filepath, 'wb+') as f:
-                            content = await resp.read()
-                            f.write(await resp.read())
-                else:
-                    # file found on disk, read from there
-                    with open(filepath, 'rb') as f:
-                        content = f.read()
-
-                # Use oppai to calculate pp if FC,
-                # along with star rating with mods.
-                with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-                    ezpp.configure(
-                        mode=gm,
-                        acc=fcAcc,
-                        mods=row['mods']
-                    )
+    @commands.command(aliases=['t'])
+    @commands.guild_only()
+    async def top(self, ctx: ContextWrap) -> None:
+        start = time.perf_counter()
+        msg = ctx.message.content.split(' ')[1:]
 
-                    ezpp.calculate_data(content)
+        rx, gm = self.parse_score_args(msg)
+        if gm is None:
+            await ctx.send(
+                'Invalid syntax: `!top <-gm #> <-rx> <usernames, .../@mentions ...>` '
+                '(only osu! & osu!taiko supported).')
+            return
 
-                    pp_if_fc, star_rating = (
-                        ezpp.get_pp(),
-                        ezpp.get_sr()
-                    )
+        if not (users := await self.get_score_users(ctx, msg)):
+            return
 
-                    row['ar'] = ezpp.get_ar()
-                    row['od'] = ezpp.get_od()
-
-                # If the user didn't fc, we need to print out
-                # the amount it would have been for an fc
-                # (with acc corrected for misses).
-                if not is_fc:
-                    row['fcPP'] = f"\n▸ \❌**{row['nmiss']}** ({pp_if_fc:,.2f}pp for {fcAcc:.2f}% FC)"
-                    row['comboed'] = '{s_combo:,}/{b_combo:,}x'.format(**row)
-                else:
-                    row['fcPP'] = ''
-                    row['comboed'] = 'FC'
-
-                # Mods string
-                if row['mods']:
-                    row['mods'] = f"+{Mods(row['mods'])!r}"
-                else:
-                    row['mods'] = 'NM'
-
-                if r := regexes['song_name'].match(row['sn']):
-                    row['sn'] = f"{truncate(r['sn'], 35)} [{truncate(r['diff'], 25)}]"
-                else:
-                    await ctx.send('<@285190493703503872> broke regex')
-                    return
+        # each user, and each of their scores are rendered concurrently,
+        # though no more than `score_concurrency` scores at a time.
+        limit = asyncio.Semaphore(self.bot.config.score_concurrency)
+        results = await asyncio.gather(*[
+            self.renders.get((user['id'], gm, rx, 'top'),
+                             self.render_top, user, gm, rx, limit)
+            for user in users
+        ], return_exceptions = True)
 
-                row['idx'] = idx + 1
+        await self.send_score_embeds(ctx, users, results, start)
 
-                scores.append('\n'.join((
-                    '{idx}. [{sn}](https://akatsuki.pw/b/{bid})',
-                    '▸ {grade} **{acc:,.2f}% {pp:,.2f}pp {mods}**{fcPP}',
-                    '▸ {{ {n100}x100, {n50}x50 }} {comboed}',
-                    '▸ \⭐{difficulty:.2f} \🎵{bpm:,} \🕰️{length} **AR**{ar:.2f} **OD**{od:.2f}'
-                )).format(**row, difficulty=star_rating))
+    async def render_top(self, user: dict[str, Union[int, str]], gm: int,
+                         rx: bool, limit: asyncio.Semaphore) -> Union[discord.Embed, str]:
+        table = 'scores_relax' if rx else 'scores'
+        res = await self.bot.db.fetchall(
+            'SELECT s.score, s.pp, s.accuracy acc, s.max_combo s_combo, '
+            's.mods, s.300_count n300, s.100_count n100, s.beatmap_md5, '
+            's.50_count n50, s.misses_count nmiss, s.time, s.completed, '
+            'b.ranked '
+            f'FROM {table} s '
+            'LEFT JOIN beatmaps b USING(beatmap_md5) '
+            'WHERE s.userid = %s AND b.ranked IN (2, 3) '
+            'AND s.play_mode = %s AND s.completed = 3 '
+            'ORDER BY s.pp DESC LIMIT 3',
+            [user['id'], gm]
+        )
 
-            e.add_field(
-                name = '** **', # empty title
-                value = '\n'.join(scores)
-            )
+        if not res:
+            return f"{user['name']} has no scores!"
 
-            e.set_footer(text = f'Aika v{self.bot.version}')
-            e.set_thumbnail(url = f"https://a.akatsuki.pw/{user['id']}")
-            await ctx.send(embed = e)
+        e = discord.Embed(colour = self.bot.config.embed_colour)
 
-    @commands.command(aliases=['rc', 'rs', 'r'])
-    @commands.guild_only()
-    async def recent(self, ctx: ContextWrap) -> None:
-        msg = ctx.message.content.split(' ')[1:]
+        name = self.display_name(user)
+        plural = lambda s: f"{s}'s" if s[-1] != 's' else f"{s}'"
 
-        # check command for flags
+        e.set_author(
+            name = f"{plural(name)} top 3 {gamemode_readable(gm)} plays.",
+            url = f"https://akatsuki.pw/u/{user['id']}?mode={gm}&rx={int(rx)}",
+            icon_url = f"https://a.akatsuki.pw/{user['id']}"
+        )
 
-        if (rx := '-rx' in msg):
-            # relax flag specified in command
-            msg.remove('-rx')
+        # Render each score as its own block of text, and join them
+        # by newlines since we want the whole embed in a single block.
+        # A score which fails to render only replaces its own block.
+        scores = await asyncio.gather(*[
+            self.render_top_score(idx + 1, row, gm, limit)
+            for idx, row in enumerate(res)
+        ], return_exceptions = True)
+
+        for idx, s in enumerate(scores):
+            if isinstance(s, BaseException):
+                log(f"Failed to render score for {res[idx]['beatmap_md5']} ({s!r}).", Ansi.LRED)
+                scores[idx] = f'{idx + 1}. Failed to load score.'
+
+        e.add_field(
+            name = '** **', # empty title
+            value = '\n'.join(scores)
+        )
 
-        if '-gm' in msg:
-            # gamemode flag specified in command
+        e.set_thumbnail(url = f"https://a.akatsuki.pw/{user['id']}")
+        return e
 
-            # get index of the -gm flag, and remove it.
-            idx = msg.index('-gm')
-            msg.remove('-gm')
+    async def render_top_score(self, idx: int, row: dict, gm: int,
+                               limit: asyncio.Semaphore) -> str:
+        async with limit:
+            if not (bmap := await self.beatmaps.get(row['beatmap_md5'])):
+                return f'{idx}. Error getting map.'
 
-            # ensure the gm is present and is decimal
-            if len(msg) < idx or not msg[idx].isdecimal():
-                await ctx.send(
-                    'Invalid syntax: `!recent <-rx> <-gm #> <username/@mentions ...>`.')
-                return
+            row['hit_length'] = bmap['hit_length']
+            row['bpm'] = bmap['bpm']
+            row['b_combo'] = bmap['max_combo']
+            row['sn'] = f"{truncate(bmap['title'], 35)} [{truncate(bmap['version'], 25)}]"
+            row['bid'] = bmap['id']
 
-            # get the gm flag, make sure it's in valid range
-            gm = int(msg.pop(idx))
-            if gm not in range(2):
-                await ctx.send(
-                    'Invalid gamemode (only osu! & osu!taiko supported).')
-                return
+            # "fc" is atleast 98% of fc combo + no misses
+            is_fc = (row['s_combo'] > int(row['b_combo'] * 0.98) and
+                     row['nmiss'] == 0)
 
+            if is_fc:
+                fcAcc = row['acc']
+            else:
+                fcAcc = (calc_accuracy_std(
+                    n300 = row['n300'],
+                    n100 = row['n100'],
+                    n50 = row['n50'],
+                    nmiss = 0) if gm == 0 \
+                else calc_accuracy_taiko(
+                    n300 = row['n300'],
+                    n150 = row['n100'], # lol
+                    nmiss = 0)) * 100.0
+
+            # Calculate pp if FC,
+            # along with star rating with mods.
+            if not (calc := await self.calc_fc(
+                row['beatmap_md5'], row['bid'], gm, row['mods'], fcAcc
+            )):
+                return f"{idx}. [{row['sn']}](https://akatsuki.pw/b/{row['bid']}) - Failed to calculate pp."
+
+        if row['mods'] & (Mods.DOUBLETIME | Mods.NIGHTCORE):
+            row['hit_length'] = int(row['hit_length'] / 1.5)
+            row['bpm'] = int(row['bpm'] * 1.5)
+        elif row['mods'] & Mods.HALFTIME:
+            row['hit_length'] = int(row['hit_length'] * 1.5)
+            row['bpm'] = int(row['bpm'] / 1.5)
+
+        # Length and ranked status as formatted strings
+        row['length'] = seconds_readable(row['hit_length'])
+        row['ranked'] = status_readable(row['ranked'])
+
+        # Letter grade
+        # This is done.. stragely
+        # TODO: don't do strangely?
+        row['grade'] = self.bot.get_emoji(
+            self.bot.config.akatsuki['grade_emojis'][
+                accuracy_grade(
+                    gm, row['acc'], row['mods'],
+                    row['n300'], row['n100'], row['n50'],
+                    row['nmiss']) if row['completed'] != 0 else 'F'
+            ])
+
+        pp_if_fc, star_rating = calc.pp, calc.sr
+        row['ar'] = calc.ar
+        row['od'] = calc.od
+
+        # If the user didn't fc, we need to print out
+        # the amount it would have been for an fc
+        # (with acc corrected for misses).
+        if not is_fc:
+            row['fcPP'] = f"\n▸ \❌**{row['nmiss']}** ({pp_if_fc:,.2f}pp for {fcAcc:.2f}% FC)"
+            row['comboed'] = '{s_combo:,}/{b_combo:,}x'.format(**row)
         else:
-            # no gamemode flag specified, default to osu!standard
-            gm = 0
+            row['fcPP'] = ''
+            row['comboed'] = 'FC'
 
-        if not msg:
-            # no mentions or username specified, check for akatsuki link
-            users = [await self.get_osu(ctx.author.id)]
+        # Mods string
+        if row['mods']:
+            row['mods'] = f"+{Mods(row['mods'])!r}"
         else:
-            # either mention or username provided
-            if mentions := ctx.message.mentions:
-                users = [await self.get_osu(m.id) for m in mentions]
-            else:
-                # XXX: while simple, this only allows a single name..
-                users = [await self.get_osu_from_name(' '.join(msg))]
+            row['mods'] = 'NM'
 
-        if not all(users):
-            await ctx.send('Could not find all users specified.')
-            return
+        row['idx'] = idx
 
-        # only allow bot owner to fetch restricted users
-        if (
-            not all(u['priv'] & 1 for u in users) and
-            not await self.bot.is_owner(ctx.author)
-        ):
-            await ctx.send('You have insufficient privileges.')
-            return
-
-        if len(users) > 3:
-            await ctx.send('No more than 3 users may be requested at a time!')
-            return
-
-        for user in users:
-            table = 'scores_relax' if rx else 'scores'
-            if not (row := await self.bot.db.fetch(
-                # Get all information we need for the embed.
-                'SELECT s.score, s.pp, s.accuracy acc, s.max_combo '
-                's_combo, s.mods, s.300_count n300, s.100_count n100, '
-                's.50_count n50, s.misses_count nmiss, s.time, s.completed, '
-
-                's.beatmap_md5, b.ranked, '
-
-                f'FROM {table} s '
-                'LEFT JOIN beatmaps b USING(beatmap_md5) '
-                'WHERE s.userid = %s AND b.ranked IN (2, 3, 5) '
-                'AND s.play_mode = %s '
-                'ORDER BY s.time DESC LIMIT 1',
-                [user['id'], gm]
-                )
-            ):
-                await ctx.send('The user has no scores!')
-                return
+        return '\n'.join((
+            '{idx}. [{sn}](https://akatsuki.pw/b/{bid})',
+            '▸ {grade} **{acc:,.2f}% {pp:,.2f}pp {mods}**{fcPP}',
+            '▸ {{ {n100}x100, {n50}x50 }} {comboed}',
+            '▸ \⭐{difficulty:.2f} \🎵{bpm:,} \🕰️{length} **AR**{ar:.2f} **OD**{od:.2f}'
+        )).format(**row, difficulty=star_rating)
 
-            # XXX:HACK: we certainly don't need to do an api request *every* time.
-            # we should be updating the info in the db and have a ttl for it
-            async with self.bot.http_sess.get(
-                'https://old.ppy.sh/api/get_beatmaps',
-                params={
-                    'h': row['beatmap_md5'],
-                    'k': random.choice(self.bot.config.osu_api_keys),
-                },
-            ) as req:
-                map_info = await req.json(content_type=None)
-
-                if not map_info or req.status != 200:
-                    await ctx.send(f'Error getting map ({row["beatmap_md5"]}).')
-                    return
-
-                map_info = map_info[0]
-
-                row['hit_length'] = int(map_info['hit_length'])
-                row['bpm'] = float(map_info['bpm'])
-                row['b_combo'] = int(map_info['max_combo'])
-                row['sn'] = f"{map_info['artist']} - {map_info['title']} [{map_info['version']}]"
-                row['bid'] = int(map_info['beatmap_id'])
-                row['bsid'] = int(map_info['beatmapset_id'])
+    @commands.command(aliases=['rc', 'rs', 'r'])
+    @commands.guild_only()
+    async def recent(self, ctx: ContextWrap) -> None:
+        start = time.perf_counter()
+        msg = ctx.message.content.split(' ')[1:]
 
-            e = discord.Embed(
-                title = row['sn'],
-                url = f"https://akatsuki.pw/b/{row['bid']}",
-                colour = self.bot.config.embed_colour
-            )
+        # check command for flags
+        rx, gm = self.parse_score_args(msg)
+        if gm is None:
+            await ctx.send(
+                'Invalid syntax: `!recent <-rx> <-gm #> <usernames, .../@mentions ...>` '
+                '(only osu! & osu!taiko supported).')
+            return
 
-            clan = await self.bot.db.fetch(
-                'SELECT c.tag FROM users u '
-                'LEFT JOIN clans c ON c.id = u.clan_id '
-                'WHERE u.id = %s', [user['id']]
-            )
+        if not (users := await self.get_score_users(ctx, msg)):
+            return
 
-            if clan and clan['tag']:
-                _name = f"[{clan['tag']}] {user['name']}"
-            else:
-                _name = user['name']
+        limit = asyncio.Semaphore(self.bot.config.score_concurrency)
+        results = await asyncio.gather(*[
+            self.renders.get((user['id'], gm, rx, 'recent'),
+                             self.render_recent, user, gm, rx, limit)
+            for user in users
+        ], return_exceptions = True)
+
+        await self.send_score_embeds(ctx, users, results, start)
+
+    async def render_recent(self, user: dict[str, Union[int, str]], gm: int,
+                            rx: bool, limit: asyncio.Semaphore) -> Union[discord.Embed, str]:
+        table = 'scores_relax' if rx else 'scores'
+        row = await self.bot.db.fetch(
+            # Get all information we need for the embed.
+            'SELECT s.score, s.pp, s.accuracy acc, s.max_combo '
+            's_combo, s.mods, s.300_count n300, s.100_count n100, '
+            's.50_count n50, s.misses_count nmiss, s.time, s.completed, '
+            's.beatmap_md5, b.ranked '
+            f'FROM {table} s '
+            'LEFT JOIN beatmaps b USING(beatmap_md5) '
+            'WHERE s.userid = %s AND b.ranked IN (2, 3, 5) '
+            'AND s.play_mode = %s '
+            'ORDER BY s.time DESC LIMIT 1',
+            [user['id'], gm]
+        )
 
-            plural = lambda s: f"{s}'s" if s[-1] != 's' else f"{s}'"
+        if not row:
+            return f"{user['name']} has no scores!"
 
-            e.set_author(
-                name = f"{plural(_name)} most recent {gamemode_readable(gm)} play.",
-                url = f"https://akatsuki.pw/u/{user['id']}?mode={gm}&rx={int(rx)}",
-                icon_url = f"https://a.akatsuki.pw/{user['id']}"
-            )
+        plural = lambda s: f"{s}'s" if s[-1] != 's' else f"{s}'"
+        author = f"{plural(self.display_name(user))} most recent {gamemode_readable(gm)} play."
 
-            # Letter grade
-            # This is done.. stragely
-            # TODO: don't do strangely?
-            row['grade'] = self.bot.get_emoji(
-                self.bot.config.akatsuki['grade_emojis'][
-                    accuracy_grade(
-                        gm, row['acc'], row['mods'],
-                        row['n300'], row['n100'], row['n50'],
-                        row['nmiss']
-                    ) if row['completed'] != 0 else 'F'
-                ]
-            )
+        return await self.render_play(user, row, gm, rx, limit, author)
 
-            if row['mods'] & (Mods.DOUBLETIME | Mods.NIGHTCORE):
-                row['hit_length'] = int(row['hit_length'] / 1.5)
-                row['bpm'] = int(row['bpm'] * 1.5)
-            elif row['mods'] & Mods.HALFTIME:
-                row['hit_length'] = int(row['hit_length'] * 1.5)
-                row['bpm'] = int(row['bpm'] / 1.5)
+    async def render_play(self, user: dict[str, Union[int, str]], row: dict,
+                          gm: int, rx: bool, limit: asyncio.Semaphore,
+                          author: str) -> Union[discord.Embed, str]:
+        """Render a single score in full, as used by !recent."""
+        async with limit:
+            if not (bmap := await self.beatmaps.get(row['beatmap_md5'])):
+                return f'Error getting map ({row["beatmap_md5"]}).'
 
-            # Length and ranked status as formatted strings
-            row['length'] = seconds_readable(int(row['hit_length']))
-            row['ranked'] = status_readable(row['ranked'])
+            row['hit_length'] = bmap['hit_length']
+            row['bpm'] = bmap['bpm']
+            row['b_combo'] = bmap['max_combo']
+            row['sn'] = f"{bmap['artist']} - {bmap['title']} [{bmap['version']}]"
+            row['bid'] = bmap['id']
+            row['bsid'] = bmap['set_id']
 
             is_fc = (row['s_combo'] > int(row['b_combo'] * 0.98) and
                      row['nmiss'] == 0)
@@ -553,84 +574,228 @@ class Akatsuki(commands.Cog):
                     )
                 ) * 100.0
 
-            bmap_id = row['bid']
-            filepath = f".data/maps/{bmap_id}.osu"
-            if not os.path.exists(filepath):
-                # file not on disk, download from osu!api
-                async with self.bot.http_sess.get(f'https://old.ppy.sh/osu/{bmap_id}') as resp:
-                    if not resp or resp.status != 200:
-                        log(f'Failed to get .osu file for {bmap_id}', Ansi.LRED)
-                        await ctx.send('Failed to find .osu file.')
-                        return
-
-                    with open(filepath, 'wb+') as f:
-                        content = await resp.read()
-                        f.write(await resp.read())
-            else:
-                # file found on disk, read from there
-                with open(filepath, 'rb') as f:
-                    content = f.read()
+            # Calculate pp if FC, along with star rating with mods
+            # (with the engine configured for the mode, see pp_calc).
+            if not (calc := await self.calc_fc(
+                row['beatmap_md5'], row['bid'], gm, row['mods'], fcAcc
+            )):
+                return f"Failed to calculate pp ({row['sn']})."
 
-            # Use oppai to calculate pp if FC,
-            # along with star rating with mods.
-            # NOTE: this is wrong still, since we lost oppai-ng source,
-            # we *really* have to use the old binary :(
-            with OppaiWrapper('oppai-ng/liboppai.so') as ezpp:
-                ezpp.configure(
-                    mode=gm,
-                    acc=fcAcc,
-                    mods=row['mods']
-                )
+        e = discord.Embed(
+            title = row['sn'],
+            url = f"https://akatsuki.pw/b/{row['bid']}",
+            colour = self.bot.config.embed_colour
+        )
+
+        e.set_author(
+            name = author,
+            url = f"https://akatsuki.pw/u/{user['id']}?mode={gm}&rx={int(rx)}",
+            icon_url = f"https://a.akatsuki.pw/{user['id']}"
+        )
 
-                ezpp.calculate_data(content)
+        # Letter grade
+        # This is done.. stragely
+        # TODO: don't do strangely?
+        row['grade'] = self.bot.get_emoji(
+            self.bot.config.akatsuki['grade_emojis'][
+                accuracy_grade(
+                    gm, row['acc'], row['mods'],
+                    row['n300'], row['n100'], row['n50'],
+                    row['nmiss']
+                ) if row['completed'] != 0 else 'F'
+            ]
+        )
 
-                pp_if_fc, star_rating = (
-                    ezpp.get_pp(),
-                    ezpp.get_sr()
-                )
+        if row['mods'] & (Mods.DOUBLETIME | Mods.NIGHTCORE):
+            row['hit_length'] = int(row['hit_length'] / 1.5)
+            row['bpm'] = int(row['bpm'] * 1.5)
+        elif row['mods'] & Mods.HALFTIME:
+            row['hit_length'] = int(row['hit_length'] * 1.5)
+            row['bpm'] = int(row['bpm'] / 1.5)
+
+        # Length and ranked status as formatted strings
+        row['length'] = seconds_readable(int(row['hit_length']))
+        row['ranked'] = status_readable(row['ranked'])
+
+        pp_if_fc, star_rating = calc.pp, calc.sr
+        row['ar'] = round(calc.ar, 2)
+        row['od'] = round(calc.od, 2)
+
+        # If the user didn't fc, we need to print out
+        # the amount it would have been for an fc
+        # (with acc corrected for misses).
+        row['fcPP'] = (
+            f'\n▸ {pp_if_fc:,.2f}pp for {fcAcc:.2f}% FC' if not is_fc else ''
+        )
 
-                row['ar'] = round(ezpp.get_ar(), 2)
-                row['od'] = round(ezpp.get_od(), 2)
+        # Mods string
+        if row['mods']:
+            row['mods'] = f"+{Mods(row['mods'])!r}"
+        else:
+            row['mods'] = 'NM'
+
+        embeds = {
+            'Score information': '\n'.join((
+                '▸ {grade} **{acc:.2f}% {pp:,.2f}** {mods} {s_combo:,}/{b_combo:,}x{fcPP}',
+                '▸ {{ {n100}x100, {n50}x50, {nmiss}xM }}')),
+            'Beatmap information': '\n'.join((
+                '**{ranked} \⭐ {difficulty:.2f} | {length} @ \🎵 {bpm}**',
+                '**AR** {ar} **OD** {od} **[__[Download](https://akatsuki.pw/d/{bsid})__]**'))
+        }
 
-            # If the user didn't fc, we need to print out
-            # the amount it would have been for an fc
-            # (with acc corrected for misses).
-            row['fcPP'] = (
-                f'\n▸ {pp_if_fc:,.2f}pp for {fcAcc:.2f}% FC' if not is_fc else ''
+        for k, v in embeds.items():
+            e.add_field(
+                name = k,
+                value = v.format(**row, difficulty=star_rating),
+                inline = False
             )
 
-            # Mods string
-            if row['mods']:
-                row['mods'] = f"+{Mods(row['mods'])!r}"
-            else:
-                row['mods'] = 'NM'
-
-            embeds = {
-                'Score information': '\n'.join((
-                    '▸ {grade} **{acc:.2f}% {pp:,.2f}** {mods} {s_combo:,}/{b_combo:,}x{fcPP}',
-                    '▸ {{ {n100}x100, {n50}x50, {nmiss}xM }}')),
-                'Beatmap information': '\n'.join((
-                    '**{ranked} \⭐ {difficulty:.2f} | {length} @ \🎵 {bpm}**',
-                    '**AR** {ar} **OD** {od} **[__[Download](https://akatsuki.pw/d/{bsid})__]**'))
-            }
-
-            for k, v in embeds.items():
-                e.add_field(
-                    name = k,
-                    value = v.format(**row, difficulty=star_rating),
-                    inline = False
-                )
+        # shown by discord in the viewer's timezone, so
+        # the embed stays correct while it's cached.
+        e.set_footer(text = 'Score submitted')
+        e.timestamp = dt.fromtimestamp(row['time'], tz.utc)
+
+        e.set_thumbnail(url = f"https://a.akatsuki.pw/{user['id']}")
+        e.set_image(url = f"https://assets.ppy.sh/beatmaps/{row['bsid']}/covers/cover.jpg")
+        return e
+
+    @commands.command()
+    @commands.guild_only()
+    async def pp(self, ctx: ContextWrap) -> None:
+        msg = ctx.message.content.split(' ')[1:]
+
+        _, gm = self.parse_score_args(msg)
+        if gm is None or not msg:
+            await ctx.send(
+                'Invalid syntax: `!pp <beatmap id/link> <+mods> <-gm #> <acc ...>` '
+                '(only osu! & osu!taiko supported).')
+            return
+
+        # accept either a beatmap id, or a link ending in one.
+        bid = msg.pop(0).split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+        if not bid.isdecimal():
+            await ctx.send('Invalid beatmap id/link.')
+            return
+
+        mods = 0
+        if msg and msg[0].startswith('+'):
+            if (mods := mods_from_str(msg.pop(0)[1:])) is None:
+                await ctx.send('Invalid mods (e.g. `+HDDT`).')
+                return
+
+        accs = [try_parse_float(a.rstrip('%')) for a in msg] or [95.0, 98.0, 99.0, 100.0]
+        if not all(acc is not None and 0 <= acc <= 100 for acc in accs):
+            await ctx.send('Accuracies must be numbers between 0 and 100.')
+            return
+
+        if len(accs) > 10:
+            await ctx.send('At most 10 accuracies, please.')
+            return
+
+        if not (md5 := await self.get_beatmap_md5(int(bid))):
+            await ctx.send('Beatmap not found.')
+            return
+
+        if not (bmap := await self.beatmaps.get(md5)):
+            await ctx.send('Error getting map.')
+            return
+
+        if not (attrs := await self.get_difficulty(md5, bmap['id'], gm, mods)):
+            await ctx.send('Failed to calculate difficulty.')
+            return
+
+        # the attributes are all we need to give
+        # the pp for every accuracy, in one pass.
+        lines = [f'**{acc:.2f}%**: {calc_pp(attrs, mods, acc):,.2f}pp' for acc in accs]
+
+        e = discord.Embed(
+            title = f"{bmap['artist']} - {bmap['title']} [{bmap['version']}]",
+            url = f"https://akatsuki.pw/b/{bmap['id']}",
+            colour = self.bot.config.embed_colour
+        )
+
+        e.add_field(
+            name = f"{gamemode_readable(gm)} +{Mods(mods)!r}" if mods else gamemode_readable(gm),
+            value = '\n'.join(lines),
+            inline = False
+        )
+
+        e.set_footer(text = (
+            f'⭐ {attrs.sr:.2f} | AR {attrs.ar:.2f} '
+            f'OD {attrs.od:.2f} | {attrs.max_combo:,}x'))
+        e.set_thumbnail(url = f"https://b.ppy.sh/thumb/{bmap['set_id']}l.jpg")
+        await ctx.send(embed = e)
+
+    async def get_beatmap_md5(self, bid: int) -> Optional[str]:
+        res = await self.bot.db.fetch(
+            'SELECT beatmap_md5 FROM beatmaps '
+            'WHERE beatmap_id = %s', [bid]
+        )
+
+        if res:
+            return res['beatmap_md5']
+
+        # not on akatsuki; try the osu!api.
+        if res := await self.bot.osu_api.get('get_beatmaps', {'b': bid}):
+            return res[0]['file_md5']
+
+    @tasks.loop(seconds = 30)
+    async def watch_scores(self) -> None:
+        await self.bot.wait_until_ready()
+        await self.links.ready.wait()
+
+        try:
+            await self.post_new_scores()
+        except Exception:
+            # the watermarks weren't committed, so
+            # these scores are tried again next time.
+            traceback.print_exc()
 
-            # format time played for the footer
-            played_at = seconds_readable_full(int(time.time() - row['time']))
-            e.set_footer(text = ' | '.join([
-                f'Aika v{self.bot.version}',
-                f'Score submitted {played_at} ago.'
-            ]))
+    async def post_new_scores(self) -> None:
+        scores = await self.score_watcher.poll(self.links.to_discord)
 
-            e.set_thumbnail(url = f"https://a.akatsuki.pw/{user['id']}")
-            e.set_image(url = f"https://assets.ppy.sh/beatmaps/{row['bsid']}/covers/cover.jpg")
-            await ctx.send(embed = e)
+        if notable := scores and await self.score_watcher.notable(scores):
+            channel = self.bot.get_channel(
+                self.bot.config.akatsuki['channels']['new_scores'])
+
+            if not channel:
+                log('New scores channel not found.', Ansi.LRED)
+                return
+
+            await self.send_new_scores(channel, notable)
+
+        self.score_watcher.commit()
+
+    async def send_new_scores(self, channel: discord.TextChannel,
+                              notable: list[tuple[bool, dict, str]]) -> None:
+        profiles = await self.profiles.get_many({row['userid'] for _, row, _ in notable})
+        limit = asyncio.Semaphore(self.bot.config.score_concurrency)
+
+        async def render(rx: bool, row: dict, kind: str) -> Optional[discord.Embed]:
+            if not (user := profiles.get(row['userid'])):
+                return
+
+            mode = gamemode_readable(row['play_mode']) + (' relax' if rx else '')
+            author = f'New {mode} {kind} by {self.display_name(user)}!'
+            return await self.render_play(user, row, row['play_mode'], rx, limit, author)
+
+        embeds = await asyncio.gather(*[
+            render(*score) for score in notable
+        ], return_exceptions = True)
+
+        # from here on, failures are only logged; retrying
+        # would post the scores which did send once more.
+        for score, e in zip(notable, embeds):
+            if not isinstance(e, discord.Embed):
+                log(f"Failed to render new score {score[1]['id']} ({e!r}).", Ansi.LRED)
+                continue
+
+            e.set_footer(text = f'Aika v{self.bot.version} | {e.footer.text}')
+
+            try:
+                await channel.send(embed = e)
+            except discord.HTTPException as exc:
+                log(f"Failed to post new score {score[1]['id']} ({exc}).", Ansi.LRED)
 
     @commands.command(aliases=['linkosu'])
     @commands.guild_only()
@@ -657,10 +822,11 @@ class Akatsuki(commands.Cog):
 
         # "Unlock" the account by setting the ID to 0 instead of null
         await self.bot.db.execute(
-            'INSERT INTO aika_akatsuki VALUES (%s, 0) '
+            'INSERT INTO aika_akatsuki (discordid, osu_id) VALUES (%s, 0) '
             'ON DUPLICATE KEY UPDATE osu_id = 0',
             [ctx.author.id]
         )
+        self.links.set(ctx.author.id, 0)
 
         await ctx.send(
             'Linking process initiated, please check '
@@ -682,6 +848,7 @@ class Akatsuki(commands.Cog):
             'WHERE discordid = %s AND osu_id = %s',
             [ctx.author.id, user['id']]
         )
+        self.links.remove(ctx.author.id)
 
         await ctx.send('\n'.join([
             'Account unlinked.',
@@ -698,48 +865,80 @@ class Akatsuki(commands.Cog):
             return
 
         t = int((next_iteration - dt.now(tz.utc)).total_seconds())
-        await ctx.send(f'Next iteration in {t // 60}:{t % 60:02d}.')
+        msg = f'Next iteration in {t // 60}:{t % 60:02d}.'
+
+        if last := self.role_sync.last_run:
+            msg += ' Last: {adds} added, {removes} removed, {failures} failed in {duration:.2f}s.'.format(**last)
+
+        await ctx.send(msg)
+
+    @tasks.loop(minutes = 1)
+    async def refresh_links(self) -> None:
+        try:
+            if not self.links.ready.is_set():
+                await self.links.load()
+            else:
+                await self.links.refresh()
+        except:
+            # try again next time, rather than stopping the loop.
+            traceback.print_exc()
 
     @tasks.loop(minutes = 15)
     async def manage_roles(self) -> None:
         await self.bot.wait_until_ready()
+        await self.sync_roles()
 
-        akatsuki = discord.utils.get(
-            self.bot.guilds, id = self.bot.config.akatsuki['id'])
+    async def sync_roles(self, dry_run: bool = False) -> dict[str, Union[int, float]]:
+        await self.links.ready.wait()
+        await self.links.refresh_privileges()
+
+        akatsuki = self.bot.get_guild(self.bot.config.akatsuki['id'])
 
         premium = discord.utils.get(akatsuki.roles, name = 'Premium')
         supporter = discord.utils.get(akatsuki.roles, name = 'Supporter')
 
-        res = defaultdict(int, {
-            row['id']: row['privileges'] for row in await self.bot.db.fetchall(
-                'SELECT a.discordid id, u.privileges FROM aika_akatsuki a '
-                'LEFT JOIN users u ON u.id = a.osu_id WHERE a.osu_id'
-            )
-        })
-
-        col = Ansi.LYELLOW
-
-        # Remove roles
-        for u in filter(lambda u: premium in u.roles, akatsuki.members):
-            if not res[u.id] & (1 << 23):
-                log(f"Removing {u}'s premium.", col)
-                await u.remove_roles(premium)
-
-        for u in filter(lambda u: supporter in u.roles, akatsuki.members):
-            if not res[u.id] & (1 << 2):
-                log(f"Removing {u}'s supporter.", col)
-                await u.remove_roles(supporter)
-
-        # Add roles
-        no_role = lambda u: not any(r in u.roles for r in {supporter, premium})
-        for u in filter(lambda u: u.id in res and no_role(u), akatsuki.members):
-            if res[u.id] & (1 << 23):
-                log(f"Adding {u}'s premium.", col)
-                await u.add_roles(premium)
-            elif res[u.id] & (1 << 2):
-                log(f"Adding {u}'s supporter.", col)
-                await u.add_roles(supporter)
+        # each role is kept while its privilege is held (so premium
+        # users keep supporter if they have it), and users with
+        # neither are given one: premium over supporter.
+        desired = {premium: set(), supporter: set()}
+        for discordID, osuID in self.links.to_osu.items():
+            if not (member := akatsuki.get_member(discordID)):
+                continue
 
+            priv = self.links.privileges.get(osuID, 0)
+            has_premium = premium in member.roles
+            has_supporter = supporter in member.roles
+            has_neither = not (has_premium or has_supporter)
+
+            if priv & (1 << 23) and (has_premium or has_neither):
+                desired[premium].add(discordID)
+
+            if priv & (1 << 2) and (
+                has_supporter or (has_neither and not priv & (1 << 23))
+            ):
+                desired[supporter].add(discordID)
+
+        changes = self.role_sync.plan(akatsuki, desired)
+        stats = await self.role_sync.apply(
+            changes, dry_run, reason = 'Akatsuki supporter status.')
+
+        log('Role sync{}: {adds} added, {removes} removed, '
+            '{failures} failed in {duration:.2f}s.'.format(
+                ' (dry run)' if dry_run else '', **stats), Ansi.LYELLOW)
+        return stats
+
+    @commands.command(hidden=True)
+    @commands.guild_only()
+    @commands.check(akatsuki_only)
+    @commands.is_owner()
+    async def syncroles(self, ctx: ContextWrap) -> None:
+        # run a role sync now; `!syncroles dry` only shows the changes.
+        dry_run = ctx.message.content.split(' ')[1:] == ['dry']
+        stats = await self.sync_roles(dry_run)
+
+        await ctx.send('{} {adds} added, {removes} removed, '
+                       '{failures} failed in {duration:.2f}s.'.format(
+                       'Would have:' if dry_run else 'Roles synced:', **stats))
 
     #################
     ### Reporting ###
@@ -288,14 +288,15 @@ class Guild(commands.Cog):
 
             # Update the mute time into sql
             # in case we restart the bot.
+            muted_until = int(time.time() + duration)
             await self.bot.db.execute(
-                'UPDATE aika_users SET muted_until = %s '
-                'WHERE discordid = %s AND guildid = %s',
-                [int(time.time() + duration), member.id, ctx.guild.id]
+                'INSERT INTO aika_users (discordid, guildid, muted_until) '
+                'VALUES (%(discord)s, %(guild)s, %(until)s) '
+                'ON DUPLICATE KEY UPDATE muted_until = %(until)s',
+                {'discord': member.id, 'guild': ctx.guild.id, 'until': muted_until}
             )
 
-            self.bot.loop.create_task(
-                self.bot.remove_role_in(member, duration, muted))
+            self.bot.mutes.schedule(member.id, ctx.guild.id, muted_until)
 
         if not mutes:
             return await ctx.send(f'No changes were made.')
@@ -1,107 +1,96 @@
 # -*- coding: utf-8 -*-
 
 import time
+import traceback
 from math import sqrt
 from random import randrange
-from typing import Union
+from typing import Callable
+from typing import Optional
 
 import discord
+from cmyui.logging import Ansi
+from cmyui.logging import log
 from discord.ext import commands
 from discord.ext import tasks
 
 from objects.aika import Aika
 from objects.aika import ContextWrap
 from objects.aika import Leaderboard
+from objects.voice import VoiceTracker
 from utils import try_parse_float
 
 class User(commands.Cog):
     def __init__(self, bot: Aika) -> None:
         self.bot = bot
+
+        self.voice = VoiceTracker()
         self.voice_xp.start()
 
+        self.flush_xp.change_interval(
+            seconds = self.bot.config.xp['flush_interval'])
+        self.flush_xp.start()
+        self.reconcile_global_xp.start()
+
     def cog_unload(self):
         self.voice_xp.cancel()
+        self.flush_xp.cancel()
+        self.reconcile_global_xp.cancel()
 
     async def set_xp(self, discordID: int,
                      guildID: int, xp: int) -> None:
-        await self.bot.db.execute(
-            'INSERT INTO aika_users (discordid, guildid, xp) '
-            'VALUES (%(discord)s, %(guild)s, %(xp)s) '
-            'ON DUPLICATE KEY UPDATE xp = %(xp)s',
-            {'discord': discordID, 'guild': guildID, 'xp': xp}
-        )
+        # any buffered xp would be applied on top
+        # of the new value, so throw it away.
+        self.bot.xp_buffer.discard(discordID, guildID)
+        self.bot.ranks.set(discordID, guildID, xp)
 
-    async def add_xp(self, discordID: int,
-                     guildID: int, xp: int) -> None:
         await self.bot.db.execute(
             'INSERT INTO aika_users (discordid, guildid, xp) '
             'VALUES (%(discord)s, %(guild)s, %(xp)s) '
-            'ON DUPLICATE KEY UPDATE xp = xp + %(xp)s',
+            'ON DUPLICATE KEY UPDATE xp = %(xp)s',
             {'discord': discordID, 'guild': guildID, 'xp': xp}
         )
 
-    async def get_xp(self, discordID: int,
-                     guildID: int) -> int:
-        res = await self.bot.db.fetch(
-            'SELECT xp FROM aika_users '
-            'WHERE discordid = %s AND guildid = %s',
-            [discordID, guildID]
-        )
+    def add_xp(self, discordID: int, guildID: int,
+               xp: int, last_xp: Optional[int] = None) -> None:
+        # written to sql on the next flush; if the buffer's
+        # full, the xp's dropped, so don't rank it either.
+        if self.bot.xp_buffer.add(discordID, guildID, xp, last_xp):
+            self.bot.ranks.add(discordID, guildID, xp)
 
-        return res['xp'] if res else 0
+    def get_xp(self, discordID: int, guildID: int) -> int:
+        # the rank index holds everyone's current
+        # xp, including anything not yet flushed.
+        return self.bot.ranks.get(discordID, guildID)
 
-    # We never want our XP to be inaccurate, so we only use
-    # a cache-like system for reading, and save to DB every write.
+    # XP gain is very hot (every message), so both xp & cooldowns
+    # are kept in memory and written behind by `self.bot.xp_buffer`;
+    # the cooldowns which are still active are loaded on startup.
 
     # Also, you may notice this cooldown is global - that is intentional!
     # Aika xp is designed to be like this, it will keep the global leaderboards
     # accurate - otherwise people could spam in 5x more servers for 5x more xp :P
-    async def blocked_until(self, discordID: int,
-                            guildID: int) -> Union[int, bool]:
-        # Check if they're in the cache.
-        if (discordID, guildID) in self.bot.cache['chatxp']:
-            return self.bot.cache['chatxp'][(discordID, guildID)]
-
-        # Get from the db.
-        ret = await self.bot.db.fetch(
-            'SELECT last_xp FROM '
-            'aika_users WHERE discordid = %s '
-            'AND guildid = %s',
-            [discordID, guildID]
-        )
-
-        return ret['last_xp'] if ret else True
-
-    async def can_collect_xp(self, discordID: int,
-                             guildID: int) -> bool:
-        return (await self.blocked_until(discordID, guildID) - time.time()) <= 0
-
-    async def update_cooldown(self, discordID: int, guildID: int,
-                              seconds: int = 60) -> None:
-        # Update the cache
-        t = int(time.time() + seconds)
-        self.bot.cache['chatxp'][(discordID, guildID)] = t
-
-        # Update the db.
-        await self.bot.db.execute(
-            'UPDATE aika_users SET last_xp = %s '
-            'WHERE discordid = %s AND guildid = %s',
-            [t, discordID, guildID]
-        )
+    def blocked_until(self, discordID: int, guildID: int) -> int:
+        return self.bot.cache['chatxp'].get((discordID, guildID), 0)
 
-    async def increment_xp(self, discordID: int, guildID: int,
-                           multiplier: float = 1.0, override: bool = False) -> None:
-        # Create the user if they don't already exist.
-        if not await self.user_exists(discordID, guildID):
-            await self.create_user(discordID, guildID)
+    def can_collect_xp(self, discordID: int, guildID: int) -> bool:
+        return (self.blocked_until(discordID, guildID) - time.time()) <= 0
 
+    def increment_xp(self, discordID: int, guildID: int,
+                     multiplier: float = 1.0, override: bool = False) -> None:
         # Make sure the user is allowed to claim xp.
-        if override or await self.can_collect_xp(discordID, guildID):
-            xprange = [int(i * multiplier) for i in self.bot.config.xp['range']]
-            await self.add_xp(discordID, guildID, randrange(*xprange))
+        if not (override or self.can_collect_xp(discordID, guildID)):
+            return
 
-            if not override:
-                await self.update_cooldown(discordID, guildID)
+        xprange = [int(i * multiplier) for i in self.bot.config.xp['range']]
+        xp = randrange(*xprange)
+
+        if override:
+            # voice xp doesn't affect the chat cooldown.
+            self.add_xp(discordID, guildID, xp)
+        else:
+            t = int(time.time() + self.bot.config.xp['ratelimit'])
+            self.bot.cache['chatxp'][(discordID, guildID)] = t
+            self.add_xp(discordID, guildID, xp, last_xp = t)
 
     @staticmethod
     async def calculate_xp(level: float) -> int:
@@ -111,14 +100,8 @@ class User(commands.Cog):
     async def calculate_level(xp: int) -> float:
         return sqrt(xp / 50.0)
 
-    async def get_rank(self, guildID: int, xp: int) -> int:
-        res = await self.bot.db.fetch(
-            'SELECT (COUNT(*) + 1) r FROM aika_users '
-            'WHERE guildid = %s AND xp > %s',
-            [guildID, xp]
-        )
-
-        return res['r'] if res else 0
+    def get_rank(self, guildID: int, xp: int) -> int:
+        return self.bot.ranks.rank(guildID, xp)
 
     async def user_exists(self, discordID: int,
                           guildID: int) -> bool:
@@ -150,7 +133,7 @@ class User(commands.Cog):
         if not message.guild:
             return
 
-        await self.increment_xp(message.author.id, message.guild.id)
+        self.increment_xp(message.author.id, message.guild.id)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before: discord.Message,
@@ -163,7 +146,7 @@ class User(commands.Cog):
         if not after.content or after.author.bot:
             return # Don't track xp for images & bots..
 
-        await self.increment_xp(after.author.id, after.guild.id)
+        self.increment_xp(after.author.id, after.guild.id)
 
     @commands.command(aliases=['profile', 'u'])
     @commands.cooldown(3, 5, commands.BucketType.user)
@@ -190,12 +173,14 @@ class User(commands.Cog):
 
         e.add_field(name = 'ID', value = target.id)
 
-        xp = await self.get_xp(target.id, target.guild.id)
+        xp = self.get_xp(target.id, target.guild.id)
         lv = await self.calculate_level(xp)
-        rank = await self.get_rank(target.guild.id, xp)
+        rank = self.get_rank(target.guild.id, xp)
+        global_rank = self.bot.ranks.global_rank(target.id)
         e.add_field(
             name = 'Activity stats',
-            value = f'**[#{rank}]** Lv. {lv:.2f} ({xp:,}xp)'
+            value = f'**[#{rank}]** Lv. {lv:.2f} ({xp:,}xp)' + (
+                f' | Global #{global_rank}' if global_rank else '')
         )
 
         ordinal = lambda n: f'{n}{"tsnrhtdd"[(n//10%10!=1)*(n%10<4)*n%10::4]}'
@@ -233,14 +218,30 @@ class User(commands.Cog):
             return await ctx.send('Invalid syntax: `!lvreq <level>`.')
 
         total_xp = await self.calculate_xp(level)
-        current_xp = await self.get_xp(ctx.author.id, ctx.guild.id)
+        current_xp = self.get_xp(ctx.author.id, ctx.guild.id)
         pc = (current_xp / total_xp) * 100.0 if current_xp < total_xp else 100.0
         await ctx.send('\n'.join((
             f'**Level progression to {level:.2f}.**',
             f'> `{current_xp:,}/{total_xp:,}xp ({pc:.2f}%)`'
         )))
 
-    # TODO: re-create global leaderboard for all servers
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def rankcheck(self, ctx: ContextWrap, sample: int = 50) -> None:
+        # compare the in-memory rank index against sql.
+        if not (mismatches := await self.bot.ranks.verify(
+            self.bot.db, self.bot.xp_buffer, sample
+        )):
+            return await ctx.send('Rank index matches sql.')
+
+        await ctx.send('\n'.join((
+            f'**{len(mismatches)}/{sample}** sampled users mismatched.',
+            '```', *(
+                '{discordid} ({guildid}): {xp}xp #{rank} | '
+                'sql: {sql_xp}xp #{sql_rank}'.format(**m)
+                for m in mismatches[:10]
+            ), '```'
+        )))
 
     @commands.command(aliases=['aika', 'help'])
     async def botinfo(self, ctx: ContextWrap) -> None:
@@ -271,62 +272,115 @@ class User(commands.Cog):
     @commands.command(aliases=['lvtop', 'xptop', 'xplb', 'lb', 'xpleaderboard'])
     @commands.guild_only()
     @commands.cooldown(3, 5, commands.BucketType.user)
-    async def leaderboard(self, ctx: ContextWrap) -> None:
-        res = await self.bot.db.fetchall(
-            'SELECT discordid id, xp FROM aika_users '
-            'WHERE guildid = %s AND xp > 0 '
-            'ORDER BY xp DESC LIMIT 10',
-            [ctx.guild.id]
+    async def leaderboard(self, ctx: ContextWrap, page: int = 1) -> None:
+        # served entirely from the rank index, which is kept
+        # up to date on every xp change; only the top
+        # `leaderboard_size` users can be paged through.
+        await self.send_leaderboard(
+            ctx, 'XP/Level Leaderboards', page,
+            lambda n, offset: self.bot.ranks.top(ctx.guild.id, n, offset)
+        )
+
+    @commands.command(aliases=['glb', 'globallb', 'globalxp'])
+    @commands.cooldown(3, 5, commands.BucketType.user)
+    async def globalleaderboard(self, ctx: ContextWrap, page: int = 1) -> None:
+        # users' xp summed across all guilds, materialized
+        # in the rank index & reconciled periodically.
+        await self.send_leaderboard(
+            ctx, 'Global XP/Level Leaderboards', page,
+            self.bot.ranks.global_top
         )
 
-        if not res:
-            # since they sent a message, they should
-            # now have xp, so reinvoke the command.
-            return await self.leaderboard(ctx)
+    async def send_leaderboard(self, ctx: ContextWrap, title: str, page: int,
+                               get_top: Callable[[int, int], list[tuple[int, int]]]) -> None:
+        lb_size = self.bot.config.xp['leaderboard_size']
+        pages = max(1, -(-lb_size // 10))
 
-        lb = Leaderboard(max_keylen = 14)
+        if page not in range(1, pages + 1):
+            return await ctx.send(f'Invalid page (must be 1-{pages}).')
 
-        for row in res:
-            name = u.name if (u := self.bot.get_user(row['id'])) else '<left guild>'
-            lb.update({name: f"Lv. {sqrt(row['xp'] / 50):.2f} ({row['xp']}xp)"})
+        offset = (page - 1) * 10
+        if not (res := get_top(min(10, lb_size - offset), offset)):
+            return await ctx.send('No users on this page yet!')
+
+        lb = Leaderboard(max_keylen = 14, offset = offset)
+
+        for discordID, xp in res:
+            name = u.name if (u := self.bot.get_user(discordID)) else str(discordID)
+            lb.update({name: f"Lv. {sqrt(xp / 50):.2f} ({xp}xp)"})
 
         e = discord.Embed(
-            title = 'XP/Level Leaderboards',
+            title = title,
             colour = self.bot.config.embed_colour,
             description = repr(lb)
         )
 
-        e.set_footer(text = f'Aika v{self.bot.version}')
+        e.set_footer(text = f'Aika v{self.bot.version} | Page {page}/{pages}')
         await ctx.send(embed = e)
 
+    # Reconcile the global leaderboard
+    @tasks.loop(hours = 1)
+    async def reconcile_global_xp(self) -> None:
+        await self.bot.wait_until_ready()
+
+        try:
+            drifted = await self.bot.ranks.reconcile(self.bot.db, self.bot.xp_buffer)
+        except Exception:
+            traceback.print_exc()
+            return
+
+        if drifted:
+            log(f'Reconciled global xp for {drifted} users.', Ansi.LYELLOW)
+
     # Voice Chat XP
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member,
+                                    before: discord.VoiceState,
+                                    after: discord.VoiceState) -> None:
+        if member.bot:
+            return
+
+        self.voice.update(member.id, member.guild.id, after, time.time())
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        # (re)build voice sessions from the current state, since
+        # we could've missed transitions while disconnected.
+        now = time.time()
+        in_voice = set()
+
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels:
+                for member in channel.members:
+                    if not member.bot:
+                        self.voice.update(member.id, guild.id, member.voice, now)
+                        in_voice.add((member.id, guild.id))
+
+        for discordID, guildID in self.voice.sessions.keys() - in_voice:
+            self.voice.update(discordID, guildID, None, now)
+
     @tasks.loop(minutes = 3.5)
     async def voice_xp(self) -> None:
         await self.bot.wait_until_ready()
 
-        is_voice = lambda c: (
-            isinstance(c, discord.VoiceChannel) and
-            c != c.guild.afk_channel
-        )
+        # each full 3.5 minutes spent in voice (weighted by
+        # mute/video/stream) is worth one roll of xp.
+        interval = self.voice_xp.minutes * 60
+        xprange = self.bot.config.xp['range']
 
-        for channel in filter(is_voice, self.bot.get_all_channels()):
-            if len(channel.voice_states) < 2: # Channel has < 2 people
-                continue
+        credited = self.voice.collect(interval, time.time())
+        for discordID, guildID, intervals in credited:
+            xp = sum(randrange(*xprange) for _ in range(intervals))
+            self.add_xp(discordID, guildID, xp)
 
-            for member, state in channel.voice_states.items():
-                if state.self_deaf: # Deafened gives no xp
-                    continue
+        if credited:
+            await self.bot.xp_buffer.flush()
 
-                multiplier = 1.0
-                if state.self_video:
-                    multiplier *= 1.5
-                if state.self_stream:
-                    multiplier *= 1.25
-                if state.self_mute:
-                    multiplier /= 2
-
-                await self.increment_xp(member, channel.guild.id,
-                                        multiplier, override = True)
+    # Write buffered XP to SQL
+    @tasks.loop(seconds = 30)
+    async def flush_xp(self) -> None:
+        await self.bot.wait_until_ready()
+        await self.bot.xp_buffer.flush()
 
 def setup(bot: commands.Bot):
     bot.add_cog(User(bot))
@@ -25,6 +25,37 @@ class Utility(commands.Cog):
         await ctx.send('Night night..')
         await self.bot.close()
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def cachestats(self, ctx: ContextWrap) -> None:
+        # show hit/miss/eviction counters for our caches.
+        lines = [
+            '{}: {}'.format(name, ', '.join(
+                f'{v:,} {k}' for k, v in cache.stats.items()))
+            for name, cache in self.bot.cache.items()
+            if hasattr(cache, 'stats')
+        ]
+
+        await ctx.send('```\n{}```'.format('\n'.join(lines)))
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def apistats(self, ctx: ContextWrap) -> None:
+        # show request/error/latency counters for each osu!api key.
+        api = self.bot.osu_api
+        lines = [
+            '{}: {:,} requests, {:,} errors, {:.0f}ms avg, {:.1f} tokens'.format(
+                k.name, k.requests, k.errors,
+                k.latency / (k.requests or 1) * 1000,
+                k.bucket.available())
+            for k in api.keys
+        ]
+
+        if api.down:
+            lines.append(f'circuit open ({api.failures} consecutive failures)')
+
+        await ctx.send('```\n{}```'.format('\n'.join(lines)))
+
     # TODO: prune_user() or combine logic for a specific user wipe into prune()
 
     @commands.command(hidden=True)
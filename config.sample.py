@@ -30,6 +30,38 @@ osu_api_keys = [
     "another_api_key",
 ]
 
+# osu!api request limits & error handling (limits are per key).
+osu_api = {
+    'rate': 20.0, # requests per second
+    'burst': 60, # requests allowed at once, beyond the rate
+    'timeout': 10.0, # seconds
+    'retries': 3,
+    'breaker_threshold': 5, # consecutive failures before we stop trying
+    'breaker_cooldown': 30.0 # seconds before trying again
+}
+
+# max size of the .osu files kept on disk (in bytes).
+osu_file_budget = 512 * 1024 * 1024
+
+# pp calculation worker processes.
+pp_calc = {
+    # the engine used for each mode; either 'oppai'
+    # or 'python' (slow, but pure python), which is also
+    # used if the configured one fails to load.
+    # bench/ppcalc.py checks their speed & results.
+    'engines': {0: 'oppai', 1: 'oppai'},
+    'engine_args': {
+        'oppai': {'lib_path': 'oppai-ng/liboppai.so'}
+    },
+    'workers': 2,
+    'max_queued': 32, # calculations waiting at once
+    'timeout': 10.0 # seconds
+}
+
+# max beatmap lookups & pp calculations a single
+# !top or !recent command will run concurrently.
+score_concurrency = 4
+
 # Aika's version #
 version = 1.0
 
@@ -41,7 +73,11 @@ thumbnails = {
 # some controls over experience gain for users.
 xp = {
     'ratelimit': 60, # how often a user can gain xp
-    'range': (2, 7)
+    'range': (2, 7),
+    'flush_interval': 30, # how often buffered xp is written to sql
+    'max_buffered': 1000, # cap on buffered users (written early at half)
+    'max_cooldowns': 100000, # active chat cooldowns kept in memory
+    'leaderboard_size': 100 # users viewable through !leaderboard's pages
 }
 
 # replace keys .format() style with values in FAQ output.
@@ -50,5 +86,9 @@ faq_replacements = {
     'key': 'val'
 }
 
+# max number of command responses kept around
+# for editing when the command message is edited.
+max_cached_responses = 10000
+
 embed_colour = 0xAC88D8 # colour for embeds
 server_build = False # whether the server is running live
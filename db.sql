@@ -9,6 +9,12 @@ create table aika_users
 	primary key (discordid, guildid)
 );
 
+create index aika_users_last_xp_index
+	on aika_users (last_xp);
+
+create index aika_users_muted_until_index
+	on aika_users (muted_until);
+
 create table aika_guilds
 (
 	guildid bigint(20) not null
@@ -26,12 +32,50 @@ create table aika_akatsuki
 	discordid bigint(20) not null
 		primary key,
 	osu_id int(11) null,
+	updated_at timestamp default current_timestamp not null on update current_timestamp,
 	constraint aika_akatsuki_osu_id_uindex
 		unique (osu_id),
 	constraint aika_akatsuki_aika_users_discordid_fk
 		foreign key (discordid) references aika_users (discordid)
 );
 
+create index aika_akatsuki_updated_at_index
+	on aika_akatsuki (updated_at);
+
+create table aika_beatmaps
+(
+	md5 char(32) not null
+		primary key,
+	id int(11) not null,
+	set_id int(11) not null,
+	status tinyint(2) not null comment 'osu!api approved status',
+	artist varchar(128) not null,
+	title varchar(128) not null,
+	version varchar(128) not null,
+	hit_length int(11) not null,
+	bpm float not null,
+	max_combo int(11) not null,
+	last_update int(11) not null
+);
+
+create table aika_difficulty
+(
+	md5 char(32) not null,
+	mode tinyint(1) not null,
+	mods int(11) not null,
+	engine varchar(16) not null,
+	sr float not null,
+	aim float not null,
+	speed float not null,
+	ar float not null,
+	od float not null,
+	max_combo int(11) not null,
+	n_circles int(11) not null,
+	n_sliders int(11) not null,
+	n_spinners int(11) not null,
+	primary key (md5, mode, mods, engine)
+);
+
 create table aika_faq
 (
   id      int(11) primary key auto_increment,
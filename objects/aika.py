@@ -3,7 +3,6 @@
 import asyncio
 import time
 import traceback
-from collections import defaultdict
 from typing import Optional
 from typing import Union
 
@@ -17,6 +16,13 @@ from cmyui.version import Version
 from discord.ext import commands
 from discord.ext import tasks
 
+from objects.cache import TTLCache
+from objects.cooldowns import CooldownStore
+from objects.filters import ContentFilter
+from objects.mutes import MuteScheduler
+from objects.osuapi import OsuAPI
+from objects.ranks import RankIndex
+from objects.xpbuffer import XPBuffer
 from utils import asciify
 from utils import truncate
 
@@ -32,19 +38,19 @@ class Leaderboard:
     """A simple class to create simple readable key: value pair
     leaderboards which can be pretty-printed for output in Discord.
     """
-    __slots__ = ('data', 'max_keylen')
+    __slots__ = ('data', 'max_keylen', 'offset')
 
     def __init__(self, **kwargs) -> None:
         self.data = kwargs.pop('data', {})
         self.max_keylen = kwargs.pop('max_keylen', 0)
+        self.offset = kwargs.pop('offset', 0) # for paginated output
 
     def update(self, d) -> None:
         self.data.update(d)
 
     def __repr__(self) -> str:
         # Maximum lenth of an ID as a string.
-        # Only needs to work for 1-2, so optimized.
-        idx_maxlen = 2 if len(self.data) > 9 else 1
+        idx_maxlen = len(str(self.offset + len(self.data)))
 
         # Maximum length of a key.
         if self.max_keylen:
@@ -64,7 +70,7 @@ class Leaderboard:
 
             lines.append(
                 '{i:0>{ilen}}. {k:^{klen}} - {v}'.format(
-                i = idx + 1, k = asciify(k), v = v,
+                i = self.offset + idx + 1, k = asciify(k), v = v,
                 ilen = idx_maxlen, klen = keylen
             ))
 
@@ -87,24 +93,20 @@ class ContextWrap(commands.Context):
         kwargs['embed'] = kwargs.pop('embed', None)
         kwargs['content'] = kwargs.pop('content', None)
 
-        cached = self.bot.cache['responses'][self.message.id]
+        responses = self.bot.cache['responses']
 
-        if cached and (time.time() - cached['timeout']) <= 0:
+        if msg := responses.get(self.message.id):
             # We have cache and it's not expired.
-            msg = cached['resp']
             await msg.edit(**kwargs)
         else: # We either have no cached val, or it's expired.
             msg = await super().send(**kwargs)
-
-            self.bot.cache['responses'][self.message.id] = {
-                'resp': msg,
-                'timeout': int(time.time()) + 300 # 5 min
-            }
+            responses.set(self.message.id, msg)
 
         return msg
 
 class Aika(commands.Bot):
-    __slots__ = ('db', 'http', 'cache', 'version', 'uptime')
+    __slots__ = ('db', 'http', 'osu_api', 'cache', 'xp_buffer', 'ranks',
+                 'mutes', 'content_filter', 'version', 'uptime', 'boot_phases')
 
     def __init__(self, **kwargs) -> None:
         super().__init__(
@@ -115,22 +117,47 @@ class Aika(commands.Bot):
 
         self.db: Optional[AsyncSQLPool] = None
         self.http_sess: Optional[aiohttp.ClientSession] = None
+        self.xp_buffer: Optional[XPBuffer] = None
+
+        # all osu!api requests share the keys' rate limits.
+        self.osu_api = OsuAPI(self, self.config.osu_api_keys,
+                              **self.config.osu_api)
+
+        # per-guild xp ranks, kept up to date on every xp change.
+        self.ranks = RankIndex()
 
         # Various types of cache
         # for different applications.
         self.cache = {
             # whenever aika replies to a command, cache
-            # {msgid: {'timeout': sent+5min, 'msg': resp}}
-            'responses': defaultdict(lambda: None),
+            # {msgid: resp} for 5 minutes (lru beyond the max size)
+            'responses': TTLCache(
+                max_size = self.config.max_cached_responses,
+                ttl = 300
+            ),
             # keep all data from aika_guilds cached from startup
             'guilds': {}, # {guildid: {guild_info ...}, ...}
-            # keep all chatxp wait times in cache.
-            'chatxp': {} # {(discordid, guildid): timeout, ...}
+            # keep all active chatxp wait times in cache.
+            'chatxp': CooldownStore( # {(discordid, guildid): timeout, ...}
+                span = self.config.xp['ratelimit'] + 1,
+                max_size = self.config.xp['max_cooldowns']
+            )
         }
 
+        # unmutes are all handled by a single task.
+        self.mutes = MuteScheduler(self)
+
+        # chat filters compiled into a single automaton.
+        self.content_filter = ContentFilter(self.config.filters,
+                                            self.config.substring_filters)
+
         self.version = Version(1, 1, 5)
         self.uptime: Optional[int] = None
 
+        # time taken by each phase of startup.
+        self.boot_phases: dict[str, float] = {}
+        self._phase_start = 0.0
+
     def when_mentioned_or_prefix(self):
         def inner(bot, msg):
             prefix = self.cache['guilds'][msg.guild.id]['cmd_prefix']
@@ -145,26 +172,8 @@ class Aika(commands.Bot):
     async def on_guild_join(self, guild: discord.Guild) -> None:
         await self.wait_until_ready()
 
-        # insert new guild into sql.
-        await self.db.execute(
-            'INSERT INTO aika_guilds '
-            '(guildid) VALUES (%s)',
-            [guild.id]
-        )
-
-        # add it to the cache.
-        # XXX: i'm fetching from sql simply because
-        # i don't care to update this every time i
-        # add something to the table for 1ms gain..
-        res = await self.db.fetch(
-            'SELECT * FROM aika_guilds '
-            'WHERE guildid = %s',
-            [guild.id]
-        )
-
-        self.cache['guilds'][guild.id] = {
-            k: res[k] for k in set(res) - {'guildid'}
-        }
+        # insert new guild into sql & cache it.
+        await self.add_guilds([guild.id])
 
     async def on_guild_remove(self, guild: discord.Guild) -> None:
         await self.wait_until_ready()
@@ -214,100 +223,73 @@ class Aika(commands.Bot):
 
     async def on_message_delete(self, msg: discord.Message) -> None:
         # Whenever a message is deleted, check if it was in
-        # our cache, and delete it (so they don't accumulate).
-        cached = self.cache['responses'][msg.id]
-
-        if cached:
+        # our cache, and delete our response along with it.
+        if resp := self.cache['responses'].pop(msg.id):
             try:
-                await cached['resp'].delete()
+                await resp.delete()
             except discord.NotFound: # No 403 since it's our own message.
                 pass # Response has already been deleted.
 
-            del self.cache['responses'][msg.id]
-
     async def on_member_ban(self, guild: discord.Guild,
                             user: Union[discord.Member, discord.User]) -> None:
         log(f'{user} was banned from {guild}.', Ansi.GREEN)
 
-    async def enqueue_mutes(self) -> None:
-        res = await self.db.fetchall(
-            'SELECT discordid, guildid, muted_until '
-            'FROM aika_users WHERE muted_until != 0'
+    async def add_guilds(self, guild_ids: list[int]) -> None:
+        # insert the new guilds into sql
+        await self.db.execute(
+            'INSERT IGNORE INTO aika_guilds (guildid) VALUES {}'.format(
+                ', '.join(['(%s)'] * len(guild_ids))),
+            guild_ids
         )
 
-        async def reset_mute(discordid: int, guildid: int) -> None:
-            await self.db.execute(
-                'UPDATE aika_users SET muted_until = 0 '
-                'WHERE discordid = %s and guildid = %s',
-                [discordid, guildid]
-            )
-
-        for row in res:
-            # get the guild
-            if not (g := self.get_guild(row['guildid'])):
-                await reset_mute(row['discordid'], row['guildid'])
-                continue
-
-            # get the member
-            if not (m := g.get_member(row['discordid'])):
-                await reset_mute(row['discordid'], row['guildid'])
-                continue
-
-            # get the muted role
-            if not (r := discord.utils.get(g.roles, name='muted')):
-                await reset_mute(row['discordid'], row['guildid'])
-                continue
-
-            duration = max(0, time.time() - row['muted_until'])
-
-            # Enqueue the task to remove their mute when complete.
-            self.loop.create_task(self.remove_role_in(m, duration, r))
+        # add them to the cache
+        # XXX: i'm fetching from sql simply because
+        # i don't care to update this every time i
+        # add something to the table for 1ms gain..
+        for row in await self.db.fetchall(
+            'SELECT * FROM aika_guilds WHERE guildid IN ({})'.format(
+                ', '.join(['%s'] * len(guild_ids))),
+            guild_ids
+        ):
+            self.cache['guilds'][row['guildid']] = {
+                k: row[k] for k in set(row) - {'guildid'}
+            }
 
     async def add_new_guilds(self) -> None:
-        for guild in self.guilds:
-            if guild.id in self.cache['guilds']:
-                continue # we already have this guild
-
-            # Guild not in our cache (or sql).
-
-            # insert the new guild into sql
-            await self.db.execute(
-                'INSERT INTO aika_guilds '
-                '(guildid) VALUES (%s)',
-                [guild.id]
-            )
-
-            # add it to the cache
-            # XXX: i'm fetching from sql simply because
-            # i don't care to update this every time i
-            # add something to the table for 1ms gain..
-            res = await self.db.fetch(
-                'SELECT * FROM aika_guilds '
-                'WHERE guildid = %s',
-                [guild.id]
-            )
-
-            self.cache['guilds'][guild.id] = {
-                k: res[k] for k in set(res) - {'guildid'}
-            }
+        # Guilds not in our cache (or sql).
+        if missing := [g.id for g in self.guilds
+                       if g.id not in self.cache['guilds']]:
+            await self.add_guilds(missing)
+            log(f'Added {len(missing)} new guilds.', Ansi.LCYAN)
 
     async def on_ready(self) -> None:
         # TODO: maybe use datetime module rather than this w/ formatting?
-        if not self.uptime:
+        first_ready = not self.uptime
+        if first_ready:
             self.uptime = time.time()
+            self.end_phase('gateway')
 
         # add any guild newly joined while
         # the bot was offline to sql.
         await self.add_new_guilds()
 
-        # load all pending mutes
-        # from sql into tasks
-        await self.enqueue_mutes()
+        # start removing mutes as they expire
+        # (including any which expired while offline).
+        self.mutes.start()
 
         print('{col}Ready{reset}: {user} ({userid})'.format(
               col = repr(Ansi.GREEN), reset = repr(Ansi.RESET),
               user = self.user, userid = self.user.id))
 
+        if first_ready:
+            self.end_phase('guild reconciliation')
+
+            # log our time-to-ready, broken down by phase.
+            log('Ready in {:.2f}s ({}).'.format(
+                sum(self.boot_phases.values()),
+                ', '.join(f'{k}: {v:.2f}s' for k, v in self.boot_phases.items())
+            ), Ansi.LCYAN)
+
     #async def on_error(self, event, *args, **kwargs) -> None:
     #    if event != 'on_message':
     #        print(f'{Ansi.LRED!r}ERR{Ansi.RESET!r}: '
@@ -374,18 +356,11 @@ class Aika(commands.Bot):
         await asyncio.sleep(duration)
         await member.add_roles(*roles)
 
-    @staticmethod
-    async def remove_role_in(member: discord.Member,
-                             duration: int, *roles) -> None:
-        await asyncio.sleep(duration)
-        await member.remove_roles(*roles)
-
     async def filter_content(self, msg: str) -> bool:
-        if not (self.config.filters or self.config.substring_filters):
+        if not self.content_filter:
             return False # filters disabled
 
-        return (any(f in msg for f in self.config.substring_filters) or
-                any(s in self.config.filters for s in msg.split(' ')))
+        return self.content_filter.search(msg)
 
     @tasks.loop(seconds=15)
     async def bg_loop(self) -> None:
@@ -403,12 +378,21 @@ class Aika(commands.Bot):
             status = discord.Status.online
         )
 
+    def end_phase(self, phase: str) -> None:
+        # record how long a phase of startup took.
+        now = time.perf_counter()
+        self.boot_phases[phase] = now - self._phase_start
+        self._phase_start = now
+
     def run(self, *args, **kwargs) -> None:
         async def runner() -> None:
+            self._phase_start = time.perf_counter()
+
             # get our db connection & http client
             self.db = AsyncSQLPool()
             await self.db.connect(self.config.mysql)
             log('Connected to mysql.', Ansi.GREEN)
+            self.end_phase('mysql')
 
             self.http_sess = aiohttp.ClientSession(json_serialize=orjson.dumps)
 
@@ -417,6 +401,24 @@ class Aika(commands.Bot):
                 row['guildid']: {k: row[k] for k in set(row) - {'guildid'}}
                 for row in await self.db.fetchall('SELECT * FROM aika_guilds')
             }
+            self.end_phase('guild settings')
+
+            # xp is written behind in batches; load any cooldowns
+            # which are still active so the hot path needs no sql.
+            self.xp_buffer = XPBuffer(self.db, self.config.xp['max_buffered'],
+                                      self.config.xp['flush_interval'])
+
+            for row in await self.db.fetchall(
+                'SELECT discordid, guildid, last_xp FROM aika_users '
+                'WHERE last_xp > %s ORDER BY last_xp DESC LIMIT %s',
+                [int(time.time()), self.config.xp['max_cooldowns']]
+            ):
+                key = (row['discordid'], row['guildid'])
+                self.cache['chatxp'][key] = row['last_xp']
+            self.end_phase('cooldowns')
+
+            await self.ranks.load(self.db)
+            self.end_phase('ranks')
 
             try: # load all of Aika's enabled cogs.
                 for ext in self.config.initial_extensions:
@@ -424,12 +426,18 @@ class Aika(commands.Bot):
             except:
                 print(f'Failed to load extension {ext}.')
                 raise RuntimeError(f'Failed to load extension {ext}.')
+            self.end_phase('extensions')
 
             try:
                 # start the bot in discordpy
                 await self.start(self.config.discord_token,
                                  *args, **kwargs)
             finally:
+                self.mutes.cancel()
+
+                # write out any buffered xp
+                await self.xp_buffer.flush()
+
                 # clean up any active sessions
                 await self.http_sess.close()
 
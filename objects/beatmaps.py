@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Optional
+from typing import TYPE_CHECKING
+from typing import Union
+
+from cmyui.logging import Ansi
+from cmyui.logging import log
+
+from objects.cache import SingleFlight
+from objects.cache import TTLCache
+from objects.osufile import parse_metadata
+
+if TYPE_CHECKING:
+    from objects.aika import Aika
+
+__all__ = ('BeatmapCache', 'BeatmapFileStore')
+
+Beatmap = dict[str, Union[int, float, str]]
+
+MD5_FILE = re.compile(r'^[0-9a-f]{32}\.osu$')
+
+# how long beatmap metadata is trusted for, by the osu!api's
+# `approved` status. maps with a leaderboard are effectively
+# immutable, while everything else may still be updated.
+STATUS_TTLS = {
+    4: None, # loved
+    2: None, # approved
+    1: None, # ranked
+    3: 60 * 60, # qualified
+}
+DEFAULT_TTL = 60 * 60 * 6 # pending, wip & graveyard
+
+def status_ttl(status: int) -> float:
+    ttl = STATUS_TTLS.get(status, DEFAULT_TTL)
+    return float('inf') if ttl is None else ttl
+
+class BeatmapCache:
+    """Beatmap metadata by md5, from an in-memory lru, the map's .osu file
+    (if it's stored locally; tests/test_osufile.py checks the parser),
+    the aika_beatmaps table, or (failing all of those) the osu!api - in
+    that order.
+
+    Concurrent misses for the same map share a single request.
+    """
+    __slots__ = ('bot', 'files', 'lru', 'inflight')
+
+    def __init__(self, bot: 'Aika', files: Optional['BeatmapFileStore'] = None,
+                 max_size: int = 5000) -> None:
+        self.bot = bot
+        self.files = files
+        self.lru = TTLCache(max_size, ttl = DEFAULT_TTL)
+        self.inflight = SingleFlight()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self.lru.stats
+
+    async def get(self, md5: str) -> Optional[Beatmap]:
+        if bmap := self.lru.get(md5):
+            return bmap
+
+        return await self.inflight.do(md5, self._fetch, md5)
+
+    def set(self, bmap: Beatmap) -> None:
+        ttl = status_ttl(bmap['status']) - (time.time() - bmap['last_update'])
+        self.lru.set(bmap['md5'], bmap, ttl)
+
+    async def _fetch(self, md5: str) -> Optional[Beatmap]:
+        if bmap := await self._fetch_file(md5):
+            return bmap
+
+        bmap = await self.bot.db.fetch(
+            'SELECT * FROM aika_beatmaps WHERE md5 = %s', [md5]
+        )
+
+        if bmap and time.time() - bmap['last_update'] < status_ttl(bmap['status']):
+            self.set(bmap)
+            return bmap
+
+        if not (new := await self._fetch_api(md5)):
+            # fall back to stale info if we have any.
+            return bmap
+
+        await self.bot.db.execute(
+            'REPLACE INTO aika_beatmaps (md5, id, set_id, status, artist, '
+            'title, version, hit_length, bpm, max_combo, last_update) '
+            'VALUES (%(md5)s, %(id)s, %(set_id)s, %(status)s, %(artist)s, '
+            '%(title)s, %(version)s, %(hit_length)s, %(bpm)s, '
+            '%(max_combo)s, %(last_update)s)', new
+        )
+
+        self.set(new)
+        return new
+
+    async def _fetch_file(self, md5: str) -> Optional[Beatmap]:
+        if not (
+            self.files and
+            (content := await self.files.get_cached(md5)) and
+            (bmap := parse_metadata(content))
+        ):
+            return
+
+        # the file is named by its md5, so this never changes;
+        # its ranked status isn't in the file, but isn't needed.
+        bmap |= {'md5': md5, 'status': None, 'last_update': int(time.time())}
+        self.lru.set(md5, bmap, float('inf'))
+        return bmap
+
+    async def _fetch_api(self, md5: str) -> Optional[Beatmap]:
+        if not (res := await self.bot.osu_api.get('get_beatmaps', {'h': md5})):
+            return
+
+        res = res[0]
+
+        return {
+            'md5': md5,
+            'id': int(res['beatmap_id']),
+            'set_id': int(res['beatmapset_id']),
+            'status': int(res['approved']),
+            'artist': res['artist'],
+            'title': res['title'],
+            'version': res['version'],
+            'hit_length': int(res['hit_length']),
+            'bpm': float(res['bpm']),
+            'max_combo': int(res['max_combo'] or 0),
+            'last_update': int(time.time())
+        }
+
+class BeatmapFileStore:
+    """.osu files on disk, stored by (and verified against) their md5.
+
+    Downloads for the same map are shared, writes go to a temporary
+    file which is atomically renamed into place, and all file i/o is
+    done off the event loop. Once the store exceeds `budget` bytes,
+    the least recently used files are removed.
+    """
+    __slots__ = ('bot', 'path', 'budget', 'files', 'size', 'inflight')
+
+    def __init__(self, bot: 'Aika', path: str = '.data/maps',
+                 budget: int = 512 * 1024 * 1024) -> None:
+        self.bot = bot
+        self.path = path
+        self.budget = budget
+
+        self.files: OrderedDict[str, int] = OrderedDict() # {md5: size}, lru first
+        self.size = 0
+        self.inflight = SingleFlight()
+
+        os.makedirs(path, exist_ok=True)
+
+        # load what's already on disk, least recently used first.
+        entries = [e for e in os.scandir(path) if MD5_FILE.match(e.name)]
+        for e in sorted(entries, key=lambda e: e.stat().st_mtime):
+            self.files[e.name[:32]] = e.stat().st_size
+            self.size += e.stat().st_size
+
+    def _filepath(self, md5: str) -> str:
+        return os.path.join(self.path, f'{md5}.osu')
+
+    async def get(self, md5: str, bid: int) -> Optional[bytes]:
+        """Return the .osu file for a map, downloading it if needed."""
+        if content := await self.get_cached(md5):
+            return content
+
+        return await self.inflight.do(md5, self._download, md5, bid)
+
+    async def get_cached(self, md5: str) -> Optional[bytes]:
+        """Return the .osu file for a map, only if it's already stored."""
+        if md5 not in self.files:
+            return
+
+        loop = asyncio.get_running_loop()
+
+        if content := await loop.run_in_executor(None, self._read, md5):
+            self.files.move_to_end(md5)
+            return content
+
+        # missing or corrupt, get rid of it.
+        log(f'Removing invalid .osu file {md5}.', Ansi.LYELLOW)
+        await self._remove(md5)
+
+    async def _download(self, md5: str, bid: int) -> Optional[bytes]:
+        async with self.bot.http_sess.get(f'https://old.ppy.sh/osu/{bid}') as resp:
+            if not resp or resp.status != 200:
+                log(f'Failed to get .osu file for {bid}', Ansi.LRED)
+                return
+
+            content = await resp.read()
+
+        if hashlib.md5(content).hexdigest() != md5:
+            # the map has been updated since this md5; use it
+            # for now, but don't store it under the wrong hash.
+            log(f'.osu file for {bid} does not match {md5}.', Ansi.LYELLOW)
+            return content
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, md5, content)
+
+        if md5 not in self.files:
+            self.files[md5] = len(content)
+            self.size += len(content)
+
+        await self._evict()
+        return content
+
+    async def _evict(self) -> None:
+        while self.size > self.budget and len(self.files) > 1:
+            await self._remove(next(iter(self.files)))
+
+    async def _remove(self, md5: str) -> None:
+        self.size -= self.files.pop(md5, 0)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._unlink, md5)
+
+    # these are all blocking, and run in an executor.
+
+    def _read(self, md5: str) -> Optional[bytes]:
+        """Read a file, returning None if it's missing or corrupt."""
+        try:
+            with open(filepath := self._filepath(md5), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+
+        if hashlib.md5(content).hexdigest() != md5:
+            return
+
+        os.utime(filepath) # for lru order across restarts
+        return content
+
+    def _write(self, md5: str, content: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+
+            os.replace(tmp, self._filepath(md5))
+        except:
+            os.remove(tmp)
+            raise
+
+    def _unlink(self, md5: str) -> None:
+        try:
+            os.remove(self._filepath(md5))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from typing import Any
+from typing import Optional
+
+__all__ = ('TTLCache', 'SingleFlight')
+
+class TTLCache:
+    """A size-bounded mapping whose entries expire `ttl` seconds after
+    being set, evicting the least recently used entry when full.
+
+    Reads never insert, and hits, misses, evictions & expirations
+    are counted for diagnostics.
+    """
+    __slots__ = ('data', 'max_size', 'ttl',
+                 'hits', 'misses', 'evictions', 'expirations')
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = self.misses = 0
+        self.evictions = self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if (entry := self.data.get(key)) is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+
+        if expires_at <= time.time():
+            del self.data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.data[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+        self.data.move_to_end(key)
+
+        self._expire()
+
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if (entry := self.data.pop(key, None)) is None:
+            return default
+
+        value, expires_at = entry
+        return value if expires_at > time.time() else default
+
+    def clear(self) -> None:
+        self.data.clear()
+
+    def _expire(self) -> None:
+        # drop expired entries from the lru end; anything
+        # left behind will be caught when it's next read.
+        now = time.time()
+        while self.data:
+            key, (_, expires_at) = next(iter(self.data.items()))
+            if expires_at > now:
+                break
+
+            del self.data[key]
+            self.expirations += 1
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'size': len(self.data), 'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'expirations': self.expirations
+        }
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single task,
+    whose result (or exception) is shared by every caller."""
+    __slots__ = ('tasks',)
+
+    def __init__(self) -> None:
+        self.tasks: dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.tasks
+
+    async def do(self, key: Hashable,
+                 func: Callable[..., Awaitable[Any]], *args) -> Any:
+        if not (task := self.tasks.get(key)):
+            task = self.tasks[key] = asyncio.create_task(func(*args))
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+
+        # shielded so one caller being cancelled
+        # doesn't cancel the work for the others.
+        return await asyncio.shield(task)
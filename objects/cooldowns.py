@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import time
+from collections.abc import Hashable
+from typing import Optional
+
+__all__ = ('CooldownStore',)
+
+class CooldownStore:
+    """A bounded {key: expiry} mapping whose entries disappear once
+    their cooldown has passed.
+
+    Expiry is handled by a hashed timing wheel with one slot per
+    second; each slot holds the keys expiring on that second (mod the
+    wheel's length), so setting, reading and expiring a key are all
+    O(1). Cooldowns longer than the wheel simply wait another lap.
+    """
+    __slots__ = ('expiry', 'wheel', 'tick', 'max_size')
+
+    def __init__(self, span: int, max_size: int) -> None:
+        self.expiry: dict[Hashable, int] = {}
+        self.wheel: list[set[Hashable]] = [set() for _ in range(max(span, 1))]
+        self.tick = int(time.time()) # last second swept
+        self.max_size = max_size
+
+    def __len__(self) -> int:
+        self._advance()
+        return len(self.expiry)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __setitem__(self, key: Hashable, expiry: int) -> None:
+        self._advance()
+
+        if expiry <= self.tick:
+            # already expired, don't bother storing it.
+            self.pop(key)
+            return
+
+        if (old := self.expiry.get(key)) is not None:
+            self.wheel[old % len(self.wheel)].discard(key)
+        elif len(self.expiry) >= self.max_size:
+            # we're at capacity; evict whichever entry is closest to
+            # expiring anyways. at worst, that user may gain xp a bit
+            # early, which is much better than unbounded memory.
+            self._evict_one()
+
+        self.expiry[key] = expiry
+        self.wheel[expiry % len(self.wheel)].add(key)
+
+    def get(self, key: Hashable, default: Optional[int] = None) -> Optional[int]:
+        self._advance()
+
+        if (expiry := self.expiry.get(key)) is None or expiry <= time.time():
+            return default
+
+        return expiry
+
+    def pop(self, key: Hashable) -> Optional[int]:
+        if (expiry := self.expiry.pop(key, None)) is not None:
+            self.wheel[expiry % len(self.wheel)].discard(key)
+
+        return expiry
+
+    def _advance(self) -> None:
+        """Sweep each slot passed since we were last called."""
+        if (now := int(time.time())) <= self.tick:
+            return
+
+        # if we've fallen more than a lap behind,
+        # each slot only needs to be swept once.
+        nslots = len(self.wheel)
+        for t in range(self.tick + 1, self.tick + 1 + min(now - self.tick, nslots)):
+            if not (slot := self.wheel[t % nslots]):
+                continue
+
+            expired = {k for k in slot if self.expiry[k] <= now}
+            slot -= expired
+
+            for key in expired:
+                del self.expiry[key]
+
+        self.tick = now
+
+    def _evict_one(self) -> None:
+        nslots = len(self.wheel)
+        for t in range(self.tick + 1, self.tick + 1 + nslots):
+            if slot := self.wheel[t % nslots]:
+                key = min(slot, key=self.expiry.__getitem__)
+                self.pop(key)
+                return
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from typing import NamedTuple
+
+from cmyui.osu.mods import Mods
+
+__all__ = ('DifficultyAttrs', 'difficulty_mods')
+
+class DifficultyAttrs(NamedTuple):
+    """Everything about a map (with a given mode & mods)
+    needed to calculate the pp of any play on it."""
+    mode: int
+    sr: float
+    aim: float # osu! only
+    speed: float # osu! only
+    ar: float # with mods applied
+    od: float # with mods applied (taiko's from its own hit windows)
+    max_combo: int
+    n_circles: int
+    n_sliders: int
+    n_spinners: int
+
+    @property
+    def n_objects(self) -> int:
+        return self.n_circles + self.n_sliders + self.n_spinners
+
+DIFFICULTY_MODS = Mods.EASY | Mods.HARDROCK | Mods.DOUBLETIME | Mods.HALFTIME
+
+def difficulty_mods(mods: int) -> int:
+    """The subset of `mods` which changes a map's difficulty."""
+    if mods & Mods.NIGHTCORE:
+        mods |= Mods.DOUBLETIME
+
+    return mods & DIFFICULTY_MODS
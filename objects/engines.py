@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import ctypes
+from abc import ABC
+from abc import abstractmethod
+
+from objects import osudiff
+from objects.difficulty import DifficultyAttrs
+
+__all__ = ('Engine', 'OppaiEngine', 'PythonEngine', 'ENGINES')
+
+class Engine(ABC):
+    """A difficulty calculator, which gives the attributes of a .osu
+    file for a mode & mods; subclasses set `name` & the `modes` they
+    support. Engines are created once in each worker process, and
+    raise from `difficulty` for any map they can't calculate.
+
+    The attributes are fed to objects/pp.py's oppai-ng pp formulas, so
+    engines must follow oppai-ng's difficulty algorithms (which
+    bench/ppcalc.py checks against bench/fixtures/).
+    """
+    __slots__ = ()
+
+    name = ''
+    modes: tuple[int, ...] = ()
+    version = 1 # bumped when results change, so stored ones aren't reused
+
+    @abstractmethod
+    def difficulty(self, content: bytes, mode: int, mods: int) -> DifficultyAttrs:
+        ...
+
+class OppaiEngine(Engine):
+    """oppai-ng, through liboppai's ezpp interface."""
+    __slots__ = ('lib',)
+
+    name = 'oppai'
+    modes = (0, 1)
+
+    def __init__(self, lib_path: str = 'oppai-ng/liboppai.so') -> None:
+        self.lib = lib = ctypes.cdll.LoadLibrary(lib_path)
+
+        lib.ezpp_new.restype = ctypes.c_void_p
+        lib.ezpp_data.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int)
+
+        for func in ('ezpp_stars', 'ezpp_aim_stars', 'ezpp_speed_stars',
+                     'ezpp_ar', 'ezpp_od'):
+            getattr(lib, func).restype = ctypes.c_float
+
+        for func in ('ezpp_free', 'ezpp_set_mode_override', 'ezpp_set_mods',
+                     'ezpp_stars', 'ezpp_aim_stars', 'ezpp_speed_stars',
+                     'ezpp_ar', 'ezpp_od', 'ezpp_max_combo', 'ezpp_ncircles',
+                     'ezpp_nsliders', 'ezpp_nspinners'):
+            getattr(lib, func).argtypes = (ctypes.c_void_p,) + (
+                (ctypes.c_int,) if func.startswith('ezpp_set') else ())
+
+    def difficulty(self, content: bytes, mode: int, mods: int) -> DifficultyAttrs:
+        lib = self.lib
+
+        # a fresh ezpp handle for each calculation,
+        # so no settings carry over between them.
+        ez = lib.ezpp_new()
+
+        try:
+            lib.ezpp_set_mode_override(ez, mode)
+            lib.ezpp_set_mods(ez, mods)
+
+            if lib.ezpp_data(ez, content, len(content)) < 0:
+                raise ValueError('oppai failed to parse the map')
+
+            return DifficultyAttrs(
+                mode, lib.ezpp_stars(ez),
+                lib.ezpp_aim_stars(ez), lib.ezpp_speed_stars(ez),
+                lib.ezpp_ar(ez), lib.ezpp_od(ez),
+                lib.ezpp_max_combo(ez), lib.ezpp_ncircles(ez),
+                lib.ezpp_nsliders(ez), lib.ezpp_nspinners(ez)
+            )
+        finally:
+            lib.ezpp_free(ez)
+
+class PythonEngine(Engine):
+    """Our pure-python implementation (objects/osudiff.py)."""
+    __slots__ = ()
+
+    name = 'python'
+    modes = (0, 1)
+    version = 2
+
+    def difficulty(self, content: bytes, mode: int, mods: int) -> DifficultyAttrs:
+        return osudiff.calc_difficulty(content, mode, mods)
+
+ENGINES: dict[str, type[Engine]] = {}
+
+for engine in (OppaiEngine, PythonEngine):
+    # an incomplete engine fails here, on import,
+    # rather than on its first job in a worker.
+    if engine.__abstractmethods__:
+        raise TypeError(f'The {engine.name} pp engine must implement '
+                        f'{", ".join(sorted(engine.__abstractmethods__))}.')
+
+    ENGINES[engine.name] = engine
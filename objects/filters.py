@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from collections.abc import Iterable
+from typing import Optional
+
+__all__ = ('ContentFilter',)
+
+# below this many filters, checking each in turn (with str's
+# own search) is quicker than walking the automaton in python.
+SCAN_MAX = 150
+
+class ContentFilter:
+    """An Aho-Corasick automaton over both kinds of chat filters.
+
+    Substring filters match anywhere in a message, while word filters
+    only match when surrounded by whitespace (or the message's ends);
+    either way, a message is scanned once regardless of filter count.
+    With fewer than `SCAN_MAX` filters, they're just checked in turn.
+    """
+    __slots__ = ('goto', 'fail', 'hit', 'word_lens', 'words', 'substrings')
+
+    def __init__(self, words: Iterable[str] = (),
+                 substrings: Iterable[str] = ()) -> None:
+        self.words = frozenset(w for w in words if w)
+        self.substrings = tuple(s for s in substrings if s)
+
+        if len(self.words) + len(self.substrings) < SCAN_MAX:
+            self.goto = None
+            return
+
+        self.goto: Optional[list[dict[str, int]]] = [{}] # state transitions
+        self.hit: list[bool] = [False] # state completes a substring
+        self.word_lens: list[tuple[int, ...]] = [()] # lengths of words completed
+
+        for s in self.substrings:
+            self.hit[self._insert(s)] = True
+
+        for w in self.words:
+            state = self._insert(w)
+            self.word_lens[state] += (len(w),)
+
+        self._link()
+
+    def __bool__(self) -> bool:
+        return bool(self.words or self.substrings)
+
+    def _insert(self, pattern: str) -> int:
+        state = 0
+
+        for ch in pattern:
+            if (nxt := self.goto[state].get(ch)) is None:
+                nxt = self.goto[state][ch] = len(self.goto)
+                self.goto.append({})
+                self.hit.append(False)
+                self.word_lens.append(())
+
+            state = nxt
+
+        return state
+
+    def _link(self) -> None:
+        # build failure links breadth-first, merging each state's
+        # matches with those of its longest proper suffix.
+        goto, hit, word_lens = self.goto, self.hit, self.word_lens
+        self.fail = fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+
+                fail[nxt] = goto[f].get(ch, 0)
+                hit[nxt] |= hit[fail[nxt]]
+                word_lens[nxt] += word_lens[fail[nxt]]
+
+    def search(self, msg: str) -> bool:
+        """Return whether `msg` matches any filter."""
+        if self.goto is None:
+            return (any(s in msg for s in self.substrings) or
+                    not self.words.isdisjoint(msg.split()))
+
+        goto, fail, hit, word_lens = self.goto, self.fail, self.hit, self.word_lens
+        state = 0
+        msg_len = len(msg)
+
+        for i, ch in enumerate(msg):
+            while state and ch not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(ch, 0)
+
+            if hit[state]:
+                return True
+
+            if word_lens[state] and (i + 1 == msg_len or msg[i + 1].isspace()):
+                for length in word_lens[state]:
+                    if (start := i - length + 1) == 0 or msg[start - 1].isspace():
+                        return True
+
+        return False
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from typing import Optional
+
+from cmyui.mysql import AsyncSQLPool
+
+__all__ = ('LinkIndex',)
+
+class LinkIndex:
+    """Every discord <-> osu! account link, kept in memory both ways
+    along with the linked osu! accounts' privileges.
+
+    Loaded in full once, then refreshed incrementally; links changed
+    since the last refresh are found by aika_akatsuki's updated_at.
+    Deleted rows can't be seen that way, so if the row count no longer
+    matches, the index is just reloaded (aika's own unlinks are applied
+    directly, so this should be rare).
+    """
+    __slots__ = ('db', 'to_osu', 'to_discord', 'privileges',
+                 'pending', 'watermark', 'ready')
+
+    def __init__(self, db: AsyncSQLPool) -> None:
+        self.db = db
+
+        self.to_osu: dict[int, int] = {} # {discordid: osu id}
+        self.to_discord: dict[int, int] = {} # {osu id: discordid}
+        self.privileges: dict[int, int] = {} # {osu id: privileges}
+        self.pending: set[int] = set() # discordids still linking
+
+        self.watermark = 0 # unix time of the latest change seen
+        self.ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.to_osu)
+
+    def osu_id(self, discordID: int) -> Optional[int]:
+        return self.to_osu.get(discordID)
+
+    def discord_id(self, osuID: int) -> Optional[int]:
+        return self.to_discord.get(osuID)
+
+    def set(self, discordID: int, osuID: Optional[int],
+            privileges: Optional[int] = None) -> None:
+        """Set a discord user's link; an osu! id of 0 (or None)
+        means the user has started, but not finished linking."""
+        self.remove(discordID)
+
+        if not osuID:
+            self.pending.add(discordID)
+            return
+
+        if (old := self.to_discord.get(osuID)) is not None:
+            # the osu! account was linked to someone else.
+            self.remove(old)
+
+        self.to_osu[discordID] = osuID
+        self.to_discord[osuID] = discordID
+        self.privileges[osuID] = privileges or 0
+
+    def remove(self, discordID: int) -> None:
+        self.pending.discard(discordID)
+
+        if (osuID := self.to_osu.pop(discordID, None)) is not None:
+            del self.to_discord[osuID]
+            del self.privileges[osuID]
+
+    async def load(self) -> None:
+        rows = await self._fetch_since(0)
+
+        # swap everything at once, so nothing
+        # sees a partially loaded index.
+        self.to_osu.clear()
+        self.to_discord.clear()
+        self.privileges.clear()
+        self.pending.clear()
+        self._apply(rows)
+
+        self.ready.set()
+
+    async def refresh(self) -> None:
+        self._apply(await self._fetch_since(self.watermark))
+
+        count, = await self.db.fetch(
+            'SELECT COUNT(*) FROM aika_akatsuki', _dict=False)
+
+        if count != len(self.to_osu) + len(self.pending):
+            # rows were deleted outside of aika.
+            await self.load()
+
+    async def _fetch_since(self, watermark: int) -> list[dict[str, int]]:
+        # rows changed within the watermark's second are read
+        # again on the next refresh, but none will be missed.
+        return await self.db.fetchall(
+            'SELECT a.discordid, a.osu_id, u.privileges, '
+            'UNIX_TIMESTAMP(a.updated_at) updated_at '
+            'FROM aika_akatsuki a LEFT JOIN users u ON u.id = a.osu_id '
+            'WHERE a.updated_at >= FROM_UNIXTIME(%s)',
+            [watermark]
+        )
+
+    def _apply(self, rows: list[dict[str, int]]) -> None:
+        for row in rows:
+            self.set(row['discordid'], row['osu_id'], row['privileges'])
+            self.watermark = max(self.watermark, int(row['updated_at']))
+
+    async def refresh_privileges(self) -> None:
+        """Re-read all linked accounts' privileges, which change
+        without their links (and so aren't seen by refresh())."""
+        if not self.to_discord:
+            return
+
+        for row in await self.db.fetchall(
+            'SELECT id, privileges FROM users WHERE id IN ({})'.format(
+                ', '.join(['%s'] * len(self.to_discord))),
+            [*self.to_discord]
+        ):
+            if row['id'] in self.privileges:
+                self.privileges[row['id']] = row['privileges']
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import heapq
+import time
+import traceback
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import discord
+from cmyui.logging import Ansi
+from cmyui.logging import log
+
+if TYPE_CHECKING:
+    from objects.aika import Aika
+
+__all__ = ('MuteScheduler',)
+
+Key = tuple[int, int] # (discordid, guildid)
+
+class MuteScheduler:
+    """Removes members' mutes once they expire, from a single task.
+
+    Pending unmutes are kept in a min-heap keyed by expiry; only mutes
+    expiring within the next `window` seconds are loaded from sql, and
+    the window slides forward as time passes. Expired mutes are reset
+    in sql in batches.
+    """
+    __slots__ = ('bot', 'window', 'heap', 'pending',
+                 'loaded_until', '_wakeup', '_task')
+
+    def __init__(self, bot: 'Aika', window: int = 60 * 60) -> None:
+        self.bot = bot
+        self.window = window
+
+        self.heap: list[tuple[int, int, int]] = [] # [(muted_until, discordid, guildid), ...]
+        self.pending: dict[Key, int] = {} # {(discordid, guildid): muted_until}
+        self.loaded_until = 0 # mutes expiring before this are in the heap
+
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task:
+            return # already running
+
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def schedule(self, discordID: int, guildID: int, muted_until: int) -> None:
+        """Schedule a mute's removal; it should already be saved in sql."""
+        # always pushed, even if beyond the loaded window; this
+        # replaces any existing mute (the old heap entry is skipped
+        # once it's no longer pending), and can't race with a load.
+        self._push((discordID, guildID), muted_until)
+        self._wakeup.set()
+
+    def _push(self, key: Key, muted_until: int) -> None:
+        if self.pending.get(key) == muted_until:
+            return # already in the heap
+
+        self.pending[key] = muted_until
+        heapq.heappush(self.heap, (muted_until, *key))
+
+    async def _load(self) -> None:
+        until = int(time.time()) + self.window
+
+        for row in await self.bot.db.fetchall(
+            'SELECT discordid, guildid, muted_until FROM aika_users '
+            'WHERE muted_until > %s AND muted_until <= %s',
+            [self.loaded_until, until]
+        ):
+            # anything pending was scheduled since, which is newer
+            # than what we may have read (mid-query, say).
+            if (key := (row['discordid'], row['guildid'])) not in self.pending:
+                self._push(key, row['muted_until'])
+
+        self.loaded_until = until
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                await asyncio.sleep(5)
+
+    async def _tick(self) -> None:
+        now = int(time.time())
+
+        # slide the window once it's half used.
+        if now >= (next_load := self.loaded_until - self.window // 2):
+            await self._load()
+            next_load = self.loaded_until - self.window // 2
+
+        # drop entries for mutes which have been replaced.
+        while self.heap and self.pending.get(self.heap[0][1:]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+        wake_at = min(self.heap[0][0], next_load) if self.heap else next_load
+
+        if wake_at > now:
+            self._wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wake_at - now)
+            except asyncio.TimeoutError:
+                pass
+
+            return
+
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            muted_until, *key = heapq.heappop(self.heap)
+            key = tuple(key)
+
+            if self.pending.get(key) == muted_until:
+                del self.pending[key]
+                due.append(key)
+
+        if due:
+            await self._unmute(due, now)
+
+    async def _unmute(self, due: list[Key], now: int) -> None:
+        for discordID, guildID in due:
+            # the guild, member or role may be gone by now;
+            # either way, the mute is reset in sql below.
+            if (
+                (g := self.bot.get_guild(guildID)) and
+                (m := g.get_member(discordID)) and
+                (r := discord.utils.get(g.roles, name='muted')) and
+                r in m.roles
+            ):
+                try:
+                    await m.remove_roles(r, reason='Mute expired.')
+                except discord.HTTPException:
+                    log(f'Failed to unmute {m} in {g}.', Ansi.LRED)
+
+        await self.bot.db.execute(
+            'UPDATE aika_users SET muted_until = 0 '
+            'WHERE muted_until <= %s AND (discordid, guildid) IN ({})'.format(
+                ', '.join(['(%s, %s)'] * len(due))),
+            [now, *(x for key in due for x in key)]
+        )
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import random
+import time
+from typing import Any
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import aiohttp
+from cmyui.logging import Ansi
+from cmyui.logging import log
+
+if TYPE_CHECKING:
+    from objects.aika import Aika
+
+__all__ = ('OsuAPI',)
+
+BASE_URL = 'https://old.ppy.sh/api'
+
+# responses worth trying again; anything else
+# (bad key, bad params..) will just fail again.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Allows `rate` requests per second on average,
+    with bursts of up to `capacity` requests."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def delay(self) -> float:
+        """Seconds until a token will be available."""
+        return max(0.0, (1 - self.available()) / self.rate)
+
+    def drain(self) -> None:
+        self.available()
+        self.tokens = 0.0
+
+class APIKey:
+    __slots__ = ('key', 'bucket', 'requests', 'errors', 'latency')
+
+    def __init__(self, key: str, rate: float, burst: int) -> None:
+        self.key = key
+        self.bucket = TokenBucket(rate, burst)
+
+        self.requests = self.errors = 0
+        self.latency = 0.0 # total, in seconds
+
+    @property
+    def name(self) -> str:
+        return f'…{self.key[-4:]}' # don't leak keys into logs
+
+class OsuAPI:
+    """A client for the osu!api (v1), shared by everything using it.
+
+    Each configured key has its own token bucket, and requests are sent
+    with whichever key has the most budget remaining (waiting for one to
+    refill if none do). Failed requests are retried with jittered
+    exponential backoff, and after `breaker_threshold` consecutive
+    failures the api is considered down; requests then fail immediately
+    for `breaker_cooldown` seconds before it's tried again.
+    """
+    __slots__ = ('bot', 'keys', 'timeout', 'retries',
+                 'breaker_threshold', 'breaker_cooldown',
+                 'failures', 'open_until')
+
+    def __init__(self, bot: 'Aika', keys: list[str],
+                 rate: float = 20.0, burst: int = 60,
+                 timeout: float = 10.0, retries: int = 3,
+                 breaker_threshold: int = 5,
+                 breaker_cooldown: float = 30.0) -> None:
+        self.bot = bot
+        self.keys = [APIKey(k, rate, burst) for k in keys]
+
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.failures = 0 # consecutive
+        self.open_until = 0.0
+
+    @property
+    def down(self) -> bool:
+        return self.open_until > time.monotonic()
+
+    async def get(self, endpoint: str, params: dict[str, Any]) -> Optional[Any]:
+        """GET an endpoint (e.g. 'get_beatmaps'), returning the decoded
+        json, or None if the request failed or the api is down."""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff(attempt))
+
+            if self.down:
+                return
+
+            key = await self._acquire()
+            status, res = await self._request(key, endpoint, params)
+
+            if status == 200:
+                self.failures = 0
+                return res
+
+            if status is not None and status not in RETRY_STATUSES:
+                log(f'osu!api {endpoint} failed ({status}).', Ansi.LRED)
+                return
+
+            self._failed()
+
+        log(f'osu!api {endpoint} failed after {attempt + 1} attempts.', Ansi.LRED)
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        # 0.5s, 1s, 2s.. up to 8s, each +/- 50%.
+        return min(8.0, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+    def _failed(self) -> None:
+        self.failures += 1
+
+        if self.failures >= self.breaker_threshold:
+            # once the cooldown ends, a single failure will reopen it.
+            if not self.down:
+                log(f'osu!api appears to be down, pausing requests '
+                    f'for {self.breaker_cooldown:.0f}s.', Ansi.LRED)
+
+            self.open_until = time.monotonic() + self.breaker_cooldown
+
+    async def _acquire(self) -> APIKey:
+        while True:
+            key = max(self.keys, key=lambda k: k.bucket.available())
+
+            if key.bucket.tokens >= 1:
+                key.bucket.tokens -= 1
+                return key
+
+            await asyncio.sleep(key.bucket.delay())
+
+    async def _request(self, key: APIKey, endpoint: str,
+                       params: dict[str, Any]) -> tuple[Optional[int], Any]:
+        key.requests += 1
+        start = time.perf_counter()
+
+        try:
+            async with self.bot.http_sess.get(
+                f'{BASE_URL}/{endpoint}',
+                params = {**params, 'k': key.key},
+                timeout = self.timeout
+            ) as resp:
+                if resp.status != 200:
+                    key.errors += 1
+
+                    if resp.status == 429:
+                        # this key is over its limit; let it recover.
+                        key.bucket.drain()
+
+                    return resp.status, None
+
+                return 200, await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            key.errors += 1
+            return None, None
+        finally:
+            key.latency += time.perf_counter() - start
@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+
+# A pure-python difficulty calculator for osu! & osu!taiko, following
+# the same algorithms as oppai-ng (quirks included); it's slow, but has
+# no dependencies & is easy to read. bench/ppcalc.py checks it against
+# oppai-ng's results for the maps in bench/fixtures/.
+
+import math
+from typing import NamedTuple
+
+from cmyui.osu.mods import Mods
+
+from objects.difficulty import DifficultyAttrs
+from objects.difficulty import difficulty_mods
+
+__all__ = ('calc_difficulty',)
+
+CIRCLE, SLIDER, SPINNER = 1, 2, 8
+
+PLAYFIELD_CENTER = (256.0, 192.0)
+STRAIN_STEP = 400.0 # ms
+DECAY_WEIGHT = 0.9
+
+# the great hit window at od 0, & how much it shrinks per od, in ms;
+# for osu! & osu!taiko.
+OD0_MS = (80.0, 50.0)
+OD_MS_STEP = (6.0, 3.0)
+
+# osu!
+STAR_SCALING_FACTOR = 0.0675
+EXTREME_SCALING_FACTOR = 0.5
+SINGLE_SPACING = 125.0
+MIN_SPEED_BONUS = 75.0 # ms
+MAX_SPEED_BONUS = 45.0 # ms
+ANGLE_BONUS_SCALE = 90.0
+AIM_TIMING_THRESHOLD = 107.0 # ms
+SPEED_ANGLE_BONUS_BEGIN = 5 * math.pi / 6
+AIM_ANGLE_BONUS_BEGIN = math.pi / 3
+
+# (decay base, weight scaling) for aim & speed.
+AIM = (0.15, 26.25)
+SPEED = (0.3, 1400.0)
+
+# osu!taiko
+TAIKO_STAR_SCALING_FACTOR = 0.04125
+TAIKO_DECAY_BASE = 0.3
+TAIKO_TYPE_CHANGE_BONUS = 0.75
+TAIKO_RHYTHM_CHANGE_BONUS = 1.0
+TAIKO_RHYTHM_CHANGE_THRESHOLD = 0.2
+TAIKO_RHYTHM_CHANGE_BASE = 2.0
+
+class HitObject(NamedTuple):
+    time: float
+    kind: int # CIRCLE, SLIDER or SPINNER
+    x: float
+    y: float
+    sound: int
+    slides: int = 0 # sliders only
+    length: float = 0.0
+    beat_len: float = 0.0 # of the timing point it's in
+    sv: float = 1.0
+    edge_sounds: tuple[int, ...] = () # each head, repeat & tail's sound
+
+def _parse(content: bytes) -> tuple[dict[str, float], list[HitObject]]:
+    """A .osu file's [General] & [Difficulty] settings, and its
+    hit objects, with their timing information for sliders."""
+    settings: dict[str, float] = {}
+    timing: list[tuple[float, float]] = [] # [(time, beat length), ...]
+    fields: list[list[str]] = []
+    section = None
+    version = 14
+
+    for line in content.decode(errors='replace').splitlines():
+        if not (line := line.strip()) or line.startswith('//'):
+            continue
+
+        if section is None and 'osu file format v' in line:
+            version = int(line.rsplit('v', 1)[1])
+        elif line.startswith('['):
+            section = line[1:-1]
+        elif section == 'HitObjects':
+            fields.append(line.split(','))
+        elif section == 'TimingPoints':
+            tp = line.split(',')
+            timing.append((float(tp[0]), float(tp[1])))
+        elif section in ('General', 'Difficulty') and ':' in line:
+            key, value = line.split(':', 1)
+            try:
+                settings[key.strip()] = float(value)
+            except ValueError:
+                pass
+
+    if not fields or not any(bl > 0 for _, bl in timing):
+        raise ValueError('map has no hit objects or timing points')
+
+    timing.sort(key=lambda tp: tp[0])
+    beat_len = next(bl for _, bl in timing if bl > 0)
+    sv = 1.0
+    tp_idx = 0
+
+    objects = []
+    for obj in fields:
+        time, kind = float(obj[2]), int(obj[3])
+
+        while tp_idx < len(timing) and timing[tp_idx][0] <= time:
+            bl = timing[tp_idx][1]
+            if bl > 0:
+                beat_len, sv = bl, 1.0
+            else:
+                sv = min(10.0, max(0.1, -100.0 / bl))
+            tp_idx += 1
+
+        x, y, sound = float(obj[0]), float(obj[1]), int(obj[4])
+
+        if kind & SLIDER:
+            slides = int(obj[6])
+
+            # any missing are the slider's own sound.
+            edge_sounds = [sound] * (slides + 1)
+            if len(obj) > 8 and obj[8]:
+                for i, edge in enumerate(obj[8].split('|')[:slides + 1]):
+                    edge_sounds[i] = int(edge)
+
+            # before v8, a slider's timing point gave its beat length
+            # scaled by its sv, and slider velocities are ignored.
+            slider_timing = (beat_len / sv, 1.0) if version < 8 else (beat_len, sv)
+
+            objects.append(HitObject(time, SLIDER, x, y, sound, slides,
+                                     float(obj[7]), *slider_timing,
+                                     tuple(edge_sounds)))
+        elif kind & SPINNER:
+            objects.append(HitObject(time, SPINNER, x, y, sound))
+        else:
+            objects.append(HitObject(time, CIRCLE, x, y, sound))
+
+    return settings, objects
+
+def _apply_mods(settings: dict[str, float], mods: int,
+                mode: int) -> tuple[float, float, float, float]:
+    """The map's (ar, od, cs, speed multiplier) with `mods` applied;
+    od is from `mode`'s hit windows."""
+    od = settings.get('OverallDifficulty', 5.0)
+    ar = settings.get('ApproachRate', od) # old maps have no ar
+    cs = settings.get('CircleSize', 5.0)
+
+    if not difficulty_mods(mods):
+        # oppai leaves these as they are (without rounding
+        # od to its hit window, as it does with mods).
+        return ar, od, cs, 1.0
+
+    speed_mul = 1.0
+    if mods & Mods.DOUBLETIME:
+        speed_mul = 1.5
+    elif mods & Mods.HALFTIME:
+        speed_mul = 0.75
+
+    mult = 1.0
+    if mods & Mods.HARDROCK:
+        mult *= 1.4
+        cs = min(10.0, cs * 1.3)
+    if mods & Mods.EASY:
+        mult *= 0.5
+        cs *= 0.5
+
+    ar, od = min(10.0, ar * mult), min(10.0, od * mult)
+
+    # ar & od don't scale linearly with speed,
+    # so go through their times in milliseconds.
+    ar_ms = (1800.0 - 120.0 * ar if ar < 5 else 1200.0 - 150.0 * (ar - 5)) / speed_mul
+    ar = (1800.0 - ar_ms) / 120.0 if ar_ms > 1200 else 5.0 + (1200.0 - ar_ms) / 150.0
+
+    od0_ms, od_ms_step = OD0_MS[mode], OD_MS_STEP[mode]
+    od_ms = min(od0_ms, max(20.0, od0_ms - math.ceil(od_ms_step * od))) / speed_mul
+    od = (od0_ms - od_ms) / od_ms_step
+
+    return ar, od, cs, speed_mul
+
+def _difficulty(peaks: list[float]) -> float:
+    """The weighted sum of each section's peak strain, hardest first."""
+    return sum(p * DECAY_WEIGHT ** i for i, p in enumerate(sorted(peaks, reverse=True)))
+
+def _peaks(times: list[float], strains: list[float], decay_base: float,
+           speed_mul: float, interval_end: float) -> list[float]:
+    """The highest strain in each `STRAIN_STEP` long section of the map,
+    from the first ending at `interval_end`.
+
+    As in oppai, `times` are the map's own (not scaled by the speed
+    multiplier), and so is the decay into the next section.
+    """
+    step = STRAIN_STEP * speed_mul
+    peaks = []
+    max_strain = 0.0
+
+    for i, time in enumerate(times):
+        while time > interval_end:
+            peaks.append(max_strain)
+
+            # the strain at the start of the next section,
+            # decayed from the last object in this one.
+            if i:
+                decay = decay_base ** ((interval_end - times[i - 1]) / 1000.0)
+                max_strain = strains[i - 1] * decay
+            else:
+                max_strain = 0.0
+
+            interval_end += step
+
+        max_strain = max(max_strain, strains[i])
+
+    peaks.append(max_strain)
+    return peaks
+
+def _spacing_weight(skill: tuple[float, float], distance: float, delta: float,
+                    prev_distance: float, prev_delta: float, angle: float) -> float:
+    strain_time = max(delta, 50.0)
+
+    if skill is AIM:
+        result = 0.0
+
+        if not math.isnan(angle) and angle > AIM_ANGLE_BONUS_BEGIN:
+            angle_bonus = math.sqrt(
+                max(prev_distance - ANGLE_BONUS_SCALE, 0.0) *
+                math.sin(angle - AIM_ANGLE_BONUS_BEGIN) ** 2 *
+                max(distance - ANGLE_BONUS_SCALE, 0.0)
+            )
+            result = 1.5 * angle_bonus ** 0.99 / max(AIM_TIMING_THRESHOLD,
+                                                     max(prev_delta, 50.0))
+
+        weighted = distance ** 0.99
+        return max(result + weighted / max(strain_time, AIM_TIMING_THRESHOLD),
+                   weighted / strain_time)
+
+    # speed
+    distance = min(distance, SINGLE_SPACING)
+    delta = max(delta, MAX_SPEED_BONUS)
+
+    speed_bonus = 1.0
+    if delta < MIN_SPEED_BONUS:
+        speed_bonus += ((MIN_SPEED_BONUS - delta) / 40.0) ** 2
+
+    angle_bonus = 1.0
+    if not math.isnan(angle) and angle < SPEED_ANGLE_BONUS_BEGIN:
+        angle_bonus += math.sin(1.5 * (SPEED_ANGLE_BONUS_BEGIN - angle)) ** 2 / 3.57
+
+        if angle < math.pi / 2:
+            angle_bonus = 1.28
+
+            if distance < ANGLE_BONUS_SCALE:
+                scale = min((ANGLE_BONUS_SCALE - distance) / 10.0, 1.0)
+                if angle >= math.pi / 4:
+                    scale *= math.sin((math.pi / 2 - angle) * 4 / math.pi)
+                angle_bonus += (1.0 - angle_bonus) * scale
+
+    return ((1 + (speed_bonus - 1) * 0.75) * angle_bonus *
+            (0.95 + speed_bonus * (distance / SINGLE_SPACING) ** 3.5)) / strain_time
+
+def _std(settings: dict[str, float], objects: list[HitObject],
+         mods: int) -> DifficultyAttrs:
+    ar, od, cs, speed_mul = _apply_mods(settings, mods, 0)
+
+    # positions are normalized to a circle radius of 52,
+    # with a small bonus for very small circles.
+    radius = 32.0 * (1.0 - 0.7 * (cs - 5.0) / 5.0)
+    scale = 52.0 / radius
+    if radius < 30.0:
+        scale *= 1.0 + min(30.0 - radius, 5.0) / 50.0
+
+    positions = []
+    for obj in objects:
+        if obj.kind == SPINNER:
+            x, y = PLAYFIELD_CENTER
+        else:
+            x, y = obj.x, 384.0 - obj.y if mods & Mods.HARDROCK else obj.y
+        positions.append((x * scale, y * scale))
+
+    times = [obj.time for obj in objects]
+
+    # the jump distance, time since & angle of each object;
+    # spinners aren't jumped to (or from).
+    distances = [0.0]
+    deltas = [0.0]
+    angles = [math.nan]
+
+    for i in range(1, len(objects)):
+        (x0, y0), (x1, y1) = positions[i - 1], positions[i]
+        if objects[i].kind == SPINNER:
+            distances.append(0.0)
+        else:
+            distances.append(math.hypot(x1 - x0, y1 - y0))
+        deltas.append((times[i] - times[i - 1]) / speed_mul)
+
+        if i > 1:
+            (px, py) = positions[i - 2]
+            v1 = (px - x0, py - y0)
+            v2 = (x1 - x0, y1 - y0)
+            dot = v1[0] * v2[0] + v1[1] * v2[1]
+            det = v1[0] * v2[1] - v1[1] * v2[0]
+            angles.append(abs(math.atan2(det, dot)))
+        else:
+            angles.append(math.nan)
+
+    stars = []
+    for skill in (AIM, SPEED):
+        decay_base, weight = skill
+        strains = [0.0] # (it's 1 for taiko)
+
+        for i in range(1, len(objects)):
+            value = 0.0
+            if objects[i].kind != SPINNER:
+                value = weight * _spacing_weight(
+                    skill, distances[i], deltas[i],
+                    distances[i - 1], deltas[i - 1], angles[i])
+
+            decay = decay_base ** (deltas[i] / 1000.0)
+            strains.append(strains[i - 1] * decay + value)
+
+        step = STRAIN_STEP * speed_mul
+        peaks = _peaks(times, strains, decay_base, speed_mul,
+                       math.ceil(times[0] / step) * step)
+        stars.append(math.sqrt(_difficulty(peaks)) * STAR_SCALING_FACTOR)
+
+    aim, speed = stars
+    sr = aim + speed + abs(speed - aim) * EXTREME_SCALING_FACTOR
+
+    tick_rate = settings.get('SliderTickRate', 1.0)
+    px_per_beat = settings.get('SliderMultiplier', 1.4) * 100.0
+
+    combo = 0
+    counts = {CIRCLE: 0, SLIDER: 0, SPINNER: 0}
+
+    for obj in objects:
+        counts[obj.kind] += 1
+
+        if obj.kind == SLIDER:
+            # head, ticks & repeats, then tail.
+            beats = obj.length * obj.slides / (px_per_beat * obj.sv)
+            ticks = math.ceil((beats - 0.1) / obj.slides * tick_rate) - 1
+            combo += max(0, ticks) * obj.slides + obj.slides + 1
+        else:
+            combo += 1
+
+    return DifficultyAttrs(0, sr, aim, speed, ar, od, combo,
+                           counts[CIRCLE], counts[SLIDER], counts[SPINNER])
+
+def _taiko_notes(settings: dict[str, float], objects: list[HitObject],
+                 convert: bool) -> tuple[list[tuple[float, bool, bool]], int, int]:
+    """The (time, is hit, is rim) of each note, and the numbers of drum
+    rolls & swells; when converting an osu! map, short sliders become a
+    hit for each tick, as they do in osu!stable. Rolls & swells are kept
+    as notes which aren't hits, as oppai gives them strain too."""
+    tick_rate = settings.get('SliderTickRate', 1.0)
+    slider_mult = settings.get('SliderMultiplier', 1.4)
+
+    notes = []
+    n_rolls = n_swells = 0
+
+    for obj in objects:
+        rim = bool(obj.sound & (2 | 8)) # whistle or clap
+
+        if obj.kind == CIRCLE:
+            notes.append((obj.time, True, rim))
+            continue
+
+        if obj.kind == SPINNER:
+            n_swells += 1
+        else:
+            if convert:
+                distance = obj.length * obj.slides * 1.4
+                beat_len = obj.beat_len / obj.sv
+
+                taiko_velocity = 100.0 * slider_mult * 1.4
+                duration = distance / taiko_velocity * beat_len
+                osu_velocity = taiko_velocity * 1000.0 / beat_len
+                tick_spacing = min(obj.beat_len / tick_rate, duration / obj.slides)
+
+                if (tick_spacing > 0 and
+                    distance / osu_velocity * 1000.0 < 2 * obj.beat_len):
+                    # each tick takes the next edge's sound.
+                    time = obj.time
+                    edge = 0
+                    while time < obj.time + duration + tick_spacing / 8:
+                        notes.append((time, True, bool(obj.edge_sounds[edge] & (2 | 8))))
+                        edge = (edge + 1) % len(obj.edge_sounds)
+                        time += tick_spacing
+                    continue
+
+            n_rolls += 1
+
+        notes.append((obj.time, False, rim))
+
+    return notes, n_rolls, n_swells
+
+def _taiko(settings: dict[str, float], objects: list[HitObject],
+           mods: int, convert: bool) -> DifficultyAttrs:
+    ar, od, _, speed_mul = _apply_mods(settings, mods, 1)
+    notes, n_rolls, n_swells = _taiko_notes(settings, objects, convert)
+
+    if not (n_hits := sum(hit for _, hit, _ in notes)):
+        raise ValueError('map has no hits')
+
+    times = [time for time, _, _ in notes]
+    strains = [1.0]
+
+    # the time since the last note, the length of the current streak
+    # of the same colour, and whether the last colour change happened
+    # after an even length streak (None before the first).
+    prev_elapsed = 0.0
+    same_since = 1
+    last_switch_even = None
+
+    for i in range(1, len(notes)):
+        (time, hit, rim), (prev_time, prev_hit, prev_rim) = notes[i], notes[i - 1]
+        elapsed = (time - prev_time) / speed_mul
+        addition = 1.0
+
+        prev_same_since, prev_switch_even = same_since, last_switch_even
+        same_since, last_switch_even = 1, None
+
+        # only hits less than a second apart (in the map's
+        # own time) get bonuses; anything else starts afresh.
+        if hit and prev_hit and time - prev_time < 1000.0:
+            # colour changes, which aren't in time with the last.
+            if rim != prev_rim:
+                last_switch_even = prev_same_since % 2 == 0
+                if prev_switch_even is not None and prev_switch_even != last_switch_even:
+                    addition += TAIKO_TYPE_CHANGE_BONUS
+            else:
+                same_since = prev_same_since + 1
+                last_switch_even = prev_switch_even
+
+            # rhythm changes, which aren't simple multiples.
+            if elapsed > 0 and prev_elapsed > 0:
+                ratio = max(prev_elapsed / elapsed, elapsed / prev_elapsed)
+                if ratio < 8:
+                    diff = math.log(ratio, TAIKO_RHYTHM_CHANGE_BASE) % 1.0
+                    if (TAIKO_RHYTHM_CHANGE_THRESHOLD < diff <
+                        1 - TAIKO_RHYTHM_CHANGE_THRESHOLD):
+                        addition += TAIKO_RHYTHM_CHANGE_BONUS
+
+        # nerf 300+bpm streams.
+        factor = 1.0
+        if elapsed < 50.0:
+            factor = 0.4 + 0.6 * elapsed / 50.0
+
+        decay = TAIKO_DECAY_BASE ** (elapsed / 1000.0)
+        strains.append(strains[i - 1] * decay + addition * factor)
+        prev_elapsed = elapsed
+
+    # unlike for osu!, oppai leaves out the last section here.
+    peaks = _peaks(times, strains, TAIKO_DECAY_BASE, speed_mul, STRAIN_STEP * speed_mul)
+    sr = _difficulty(peaks[:-1]) * TAIKO_STAR_SCALING_FACTOR
+
+    return DifficultyAttrs(1, sr, 0.0, 0.0, ar, od, n_hits,
+                           n_hits, n_rolls, n_swells)
+
+def calc_difficulty(content: bytes, mode: int, mods: int) -> DifficultyAttrs:
+    """Calculate the difficulty attributes of a .osu file in `mode`,
+    converting osu! maps to osu!taiko if needed; raises ValueError
+    for maps we can't calculate."""
+    settings, objects = _parse(content)
+    map_mode = int(settings.get('Mode', 0))
+
+    if mode == 0 and map_mode == 0:
+        return _std(settings, objects, mods)
+    elif mode == 1 and map_mode in (0, 1):
+        return _taiko(settings, objects, mods, convert = map_mode == 0)
+
+    raise ValueError(f'cannot calculate mode {mode} for a mode {map_mode} map')
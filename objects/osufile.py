@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import math
+from typing import Optional
+from typing import Union
+
+__all__ = ('parse_metadata',)
+
+Metadata = dict[str, Union[int, float, str]]
+
+# [Metadata] keys we need, and what we call them.
+METADATA_KEYS = {
+    b'Artist': 'artist',
+    b'Title': 'title',
+    b'Version': 'version',
+    b'BeatmapID': 'id',
+    b'BeatmapSetID': 'set_id'
+}
+
+def parse_metadata(content: bytes) -> Optional[Metadata]:
+    """Parse the metadata the osu!api's get_beatmaps would give us from
+    the contents of a .osu file, in a single pass over it without any
+    copies of the whole file, or a list of hit objects; returns None if
+    the file lacks anything (old files have no beatmap ids), or isn't
+    an osu! or taiko map.
+
+    Gives artist, title, version, id, set_id, bpm (of the timing point
+    lasting longest), hit_length (first to last object, minus any breaks
+    between them, in seconds) & max_combo.
+    """
+    view = memoryview(content)
+    find = content.find
+    end = len(content)
+
+    meta: Metadata = {}
+    mode = 0
+    slider_mult = 1.4
+    tick_rate = 1.0
+    breaks: list[tuple[float, float]] = [] # [(start, end), ...]
+
+    timing: list[tuple[float, float]] = [] # [(time, beat length), ...]
+    uninherited = [] # [(time, beat length)], for bpm
+
+    # hit objects are only looked at as we pass them.
+    tp_idx = n_timing = 0
+    beat_len = sv = 0.0
+    combo = 0
+    first = None
+    last = 0.0
+
+    section = b''
+    pos = 0
+
+    while pos < end:
+        if (eol := find(b'\n', pos)) == -1:
+            eol = end
+
+        line_start, pos = pos, eol + 1
+
+        if eol > line_start and content[eol - 1] == 13: # \r
+            eol -= 1
+
+        if eol == line_start:
+            continue
+
+        if content[line_start] == 91: # [
+            section = view[line_start + 1:find(b']', line_start, eol)].tobytes()
+
+            if section == b'HitObjects':
+                if not uninherited:
+                    return
+
+                # sort once, so objects can walk through them in order.
+                timing.sort(key=lambda tp: tp[0])
+                n_timing = len(timing)
+                beat_len = next(bl for _, bl in timing if bl > 0)
+                sv = 1.0
+
+            continue
+
+        if section == b'HitObjects':
+            # x,y,time,type,hitsound,...; there's one of these per
+            # object, and splitting is quicker than finding each field.
+            fields = content[line_start:eol].split(b',', 8)
+            time = float(fields[2])
+            obj_type = int(fields[3])
+
+            # apply timing points up to this object.
+            while tp_idx < n_timing and timing[tp_idx][0] <= time:
+                bl = timing[tp_idx][1]
+                if bl > 0:
+                    beat_len, sv = bl, 1.0
+                else:
+                    sv = min(10.0, max(0.1, -100.0 / bl))
+                tp_idx += 1
+
+            if obj_type & 2: # slider
+                # ...,hitsound,curve,slides,length,...
+                slides = int(fields[6])
+                beats = float(fields[7]) * slides / (slider_mult * 100.0 * sv)
+                end_time = time + beats * beat_len
+
+                if mode == 0:
+                    # head, ticks & repeats, then tail.
+                    ticks = math.ceil((beats - 0.1) / slides * tick_rate) - 1
+                    combo += (ticks if ticks > 0 else 0) * slides + slides + 1
+
+            elif obj_type & 8: # spinner
+                # ...,hitsound,end time,...
+                end_time = float(fields[5])
+                combo += mode == 0
+
+            else: # circle
+                end_time = time
+                combo += 1
+
+            if first is None:
+                first = time
+            if end_time > last:
+                last = end_time
+
+        elif section == b'TimingPoints':
+            # time,beat length,...
+            c1 = find(b',', line_start, eol)
+            c2 = find(b',', c1 + 1, eol)
+            bl = float(view[c1 + 1:c2 if c2 != -1 else eol])
+            timing.append((float(view[line_start:c1]), bl))
+
+            if bl > 0:
+                uninherited.append((timing[-1][0], bl))
+
+        elif section == b'Events':
+            # 2,start,end (or Break,start,end)
+            if content.startswith((b'2,', b'Break,'), line_start, eol):
+                c1 = find(b',', line_start, eol)
+                c2 = find(b',', c1 + 1, eol)
+                breaks.append((float(view[c1 + 1:c2]), float(view[c2 + 1:eol])))
+
+        elif (colon := find(b':', line_start, eol)) != -1:
+            key = view[line_start:colon].tobytes().strip()
+            value = view[colon + 1:eol]
+
+            if section == b'Metadata':
+                if key in METADATA_KEYS:
+                    meta[METADATA_KEYS[key]] = value.tobytes().decode(errors='replace').strip()
+            elif section == b'Difficulty':
+                if key == b'SliderMultiplier':
+                    slider_mult = float(value)
+                elif key == b'SliderTickRate':
+                    tick_rate = float(value)
+            elif section == b'General':
+                if key == b'Mode' and (mode := int(value)) not in (0, 1):
+                    return
+
+    if first is None or len(meta) != len(METADATA_KEYS):
+        return
+
+    # the bpm is that of the timing point lasting longest.
+    uninherited.sort(key=lambda tp: tp[0])
+    durations: dict[float, float] = {}
+    for i, (time, bl) in enumerate(uninherited):
+        until = uninherited[i + 1][0] if i + 1 < len(uninherited) else last
+        durations[bl] = durations.get(bl, 0.0) + max(0.0, until - time)
+
+    try:
+        meta['id'] = int(meta['id'])
+        meta['set_id'] = int(meta['set_id'])
+    except ValueError:
+        return
+
+    if meta['id'] <= 0:
+        return
+
+    # (breaks outside of the objects aren't in the drain time anyway)
+    break_len = sum(max(0.0, min(e, last) - max(s, first)) for s, e in breaks)
+
+    return meta | {
+        'bpm': round(60000.0 / max(durations, key=durations.get), 2),
+        'hit_length': int((last - first - break_len) // 1000),
+        'max_combo': combo
+    }
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+from typing import Optional
+from typing import Union
+
+from cmyui.logging import Ansi
+from cmyui.logging import log
+from cmyui.mysql import AsyncSQLPool
+from cmyui.osu.mods import Mods
+
+from objects.cache import TTLCache
+from objects.difficulty import DifficultyAttrs
+from objects.difficulty import difficulty_mods
+from objects.engines import ENGINES
+from objects.engines import Engine
+
+__all__ = ('DiffJob', 'CalcResult', 'calc_pp', 'PPCalculator', 'DifficultyStore')
+
+class DiffJob(NamedTuple):
+    osu_file: Union[bytes, str] # file contents, or a path to it
+    mode: int
+    mods: int # only the difficulty affecting ones matter
+
+class CalcResult(NamedTuple):
+    pp: float
+    sr: float
+    ar: float
+    od: float
+
+###
+# pp, from difficulty attributes. these are the formulas
+# used by oppai-ng, so should give the same results as it.
+###
+
+def _acc_std(n300: int, n100: int, n50: int, nmiss: int) -> float:
+    if not (total := n300 + n100 + n50 + nmiss):
+        return 0.0
+
+    return (n300 * 300 + n100 * 100 + n50 * 50) / (total * 300)
+
+def _hits_std(acc: float, n_objects: int, nmiss: int) -> tuple[int, int, int]:
+    """Closest (n300, n100, n50) to an accuracy (in %)."""
+    max300 = n_objects - nmiss
+    acc = max(0.0, min(acc, _acc_std(max300, 0, 0, nmiss) * 100)) / 100
+
+    n100 = math.floor(-3.0 * ((acc - 1.0) * n_objects + nmiss) * 0.5 + 0.5)
+    n50 = 0
+
+    if n100 > max300:
+        # acc too low for just 100s.
+        n100 = 0
+        n50 = min(max300, math.floor(-6.0 * ((acc - 1.0) * n_objects + nmiss) * 0.2 + 0.5))
+
+    return n_objects - n100 - n50 - nmiss, n100, n50
+
+def _pp_std(attrs: DifficultyAttrs, mods: int, acc: float,
+            combo: int, nmiss: int) -> float:
+    n_objects = attrs.n_objects
+    n300, n100, n50 = _hits_std(acc, n_objects, nmiss)
+    accuracy = _acc_std(n300, n100, n50, nmiss)
+
+    # score v1 accuracy ignores sliders & spinners (they're free 300s).
+    real_acc = _acc_std(max(0, n300 - attrs.n_sliders - attrs.n_spinners),
+                        n100, n50, nmiss)
+
+    base = lambda stars: (5.0 * max(1.0, stars / 0.0675) - 4.0) ** 3 / 100000.0
+
+    length_bonus = 0.95 + 0.4 * min(1.0, n_objects / 2000.0)
+    if n_objects > 2000:
+        length_bonus += math.log10(n_objects / 2000.0) * 0.5
+
+    miss_ratio = (nmiss / n_objects) ** 0.775 if n_objects else 0.0
+    combo_break = combo ** 0.8 / attrs.max_combo ** 0.8 if attrs.max_combo else 1.0
+
+    ar_bonus = 0.0
+    if attrs.ar > 10.33:
+        ar_bonus += 0.4 * (attrs.ar - 10.33)
+    elif attrs.ar < 8.0:
+        ar_bonus += 0.01 * (8.0 - attrs.ar)
+    ar_bonus = 1.0 + min(ar_bonus, ar_bonus * n_objects / 1000.0)
+
+    hd_bonus = 1.0 + 0.04 * (12.0 - attrs.ar) if mods & Mods.HIDDEN else 1.0
+    od_squared = attrs.od ** 2
+
+    # aim
+    aim = base(attrs.aim) * length_bonus * combo_break * hd_bonus * ar_bonus
+    if nmiss:
+        aim *= 0.97 * (1.0 - miss_ratio) ** nmiss
+
+    if mods & Mods.FLASHLIGHT:
+        fl_bonus = 1.0 + 0.35 * min(1.0, n_objects / 200.0)
+        if n_objects > 200:
+            fl_bonus += 0.3 * min(1.0, (n_objects - 200) / 300.0)
+        if n_objects > 500:
+            fl_bonus += (n_objects - 500) / 1200.0
+        aim *= fl_bonus
+
+    aim *= (0.5 + accuracy / 2.0) * (0.98 + od_squared / 2500.0)
+
+    # speed
+    speed = base(attrs.speed) * length_bonus * combo_break * hd_bonus
+    if nmiss:
+        speed *= 0.97 * (1.0 - miss_ratio) ** (nmiss ** 0.875)
+    if attrs.ar > 10.33:
+        speed *= ar_bonus
+    speed *= (0.95 + od_squared / 750.0) * accuracy ** ((14.5 - max(attrs.od, 8.0)) / 2)
+    speed *= 0.98 ** max(0.0, n50 - n_objects / 500.0)
+
+    # accuracy
+    acc_pp = 1.52163 ** attrs.od * real_acc ** 24.0 * 2.83
+    acc_pp *= min(1.15, (attrs.n_circles / 1000.0) ** 0.3)
+    if mods & Mods.HIDDEN:
+        acc_pp *= 1.08
+    if mods & Mods.FLASHLIGHT:
+        acc_pp *= 1.02
+
+    multiplier = 1.12
+    if mods & Mods.NOFAIL:
+        multiplier *= max(0.9, 1.0 - 0.02 * nmiss)
+    if mods & Mods.SPUNOUT and n_objects:
+        multiplier *= 1.0 - (attrs.n_spinners / n_objects) ** 0.85
+
+    return (aim ** 1.1 + speed ** 1.1 + acc_pp ** 1.1) ** (1 / 1.1) * multiplier
+
+def _hits_taiko(acc: float, max_combo: int, nmiss: int) -> tuple[int, int]:
+    """Closest (n300, n150) to an accuracy (in %)."""
+    max300 = max_combo - nmiss
+    acc = max(0.0, min(acc, _acc_std(max300, 0, 0, nmiss) * 100)) / 100
+
+    n150 = min(max300, math.floor(-2.0 * ((acc - 1.0) * max_combo + nmiss) + 0.5))
+    return max_combo - n150 - nmiss, n150
+
+def _pp_taiko(attrs: DifficultyAttrs, mods: int, acc: float,
+              combo: int, nmiss: int) -> float:
+    max_combo = attrs.max_combo
+    n300, n150 = _hits_taiko(acc, max_combo, nmiss)
+    accuracy = (n300 + n150 * 0.5) / max_combo if max_combo else 0.0
+
+    length_bonus = 1.0 + 0.1 * min(1.0, max_combo / 1500.0)
+
+    strain = (5.0 * max(1.0, attrs.sr / 0.0075) - 4.0) ** 2 / 100000.0
+    strain *= length_bonus * 0.985 ** nmiss
+    if max_combo:
+        # (oppai takes the misses off the combo again here.)
+        strain *= min(1.0, max(0, combo - nmiss) ** 0.5 / max_combo ** 0.5)
+    if mods & Mods.HIDDEN:
+        strain *= 1.025
+    if mods & Mods.FLASHLIGHT:
+        strain *= 1.05 * length_bonus
+    strain *= accuracy
+
+    # back to the great hit window (in ms) it's from; without
+    # mods, that's still from the map's od, rounded up to 1/3.
+    if difficulty_mods(mods):
+        window = 50.0 - 3.0 * attrs.od
+    else:
+        window = 50.0 - math.ceil(3.0 * attrs.od)
+    acc_pp = 0.0
+    if window > 0:
+        acc_pp = (150.0 / window) ** 1.1 * accuracy ** 15 * 22.0
+        acc_pp *= min(1.15, (max_combo / 1500.0) ** 0.3)
+
+    multiplier = 1.1
+    if mods & Mods.NOFAIL:
+        multiplier *= 0.9
+    if mods & Mods.HIDDEN:
+        multiplier *= 1.1
+
+    return (strain ** 1.1 + acc_pp ** 1.1) ** (1 / 1.1) * multiplier
+
+def calc_pp(attrs: DifficultyAttrs, mods: int, acc: float,
+            combo: Optional[int] = None, nmiss: int = 0) -> float:
+    """The pp of a play, from its map's difficulty attributes;
+    `combo` defaults to the max, and `acc` is a percentage."""
+    if combo is None:
+        combo = attrs.max_combo - nmiss
+
+    if attrs.mode == 1:
+        return _pp_taiko(attrs, mods, acc, combo, nmiss)
+    else:
+        return _pp_std(attrs, mods, acc, combo, nmiss)
+
+###
+# difficulty calculation, in worker processes.
+###
+
+# used for modes whose configured engine can't be created;
+# it's pure python, so it always can be (it's just slower).
+FALLBACK_ENGINE = 'python'
+
+# each worker process creates its engines once, on startup.
+_engines: dict[str, Engine] = {}
+
+def _init_worker(engine_args: dict[str, dict]) -> None:
+    for name, kwargs in engine_args.items():
+        _engines[name] = ENGINES[name](**kwargs)
+
+def _difficulty(engine: str, job: DiffJob) -> DifficultyAttrs:
+    if isinstance(job.osu_file, str):
+        with open(job.osu_file, 'rb') as f:
+            content = f.read()
+    else:
+        content = job.osu_file
+
+    return _engines[engine].difficulty(content, job.mode, job.mods)
+
+class PPCalculator:
+    """Calculates difficulty attributes on a pool of worker processes,
+    keeping the (slow, blocking) calculations off the event loop.
+
+    Each mode is calculated by the engine named for it in `engines`
+    (see objects/engines.py), created with its `engine_args`; modes
+    whose engine can't be created (e.g. liboppai is missing) fall back
+    to the python engine, so pp still works, just slower. At most
+    `max_queued` calculations may be outstanding at once, and each
+    must complete within `timeout` seconds.
+    """
+    __slots__ = ('engines', 'pool', 'slots', 'timeout')
+
+    def __init__(self, engines: Optional[dict[int, str]] = None,
+                 engine_args: Optional[dict[str, dict]] = None,
+                 workers: int = 2, max_queued: int = 32,
+                 timeout: float = 10.0) -> None:
+        self.engines = engines or {0: 'oppai', 1: 'oppai'}
+
+        for mode, name in self.engines.items():
+            if name not in ENGINES:
+                raise ValueError(f'Unknown pp engine {name!r}.')
+            if mode not in ENGINES[name].modes:
+                raise ValueError(f'The {name} pp engine does not support mode {mode}.')
+
+        engine_args = engine_args or {}
+
+        # create each engine here once, so a misconfigured one is
+        # found (and replaced) on startup, rather than in every worker.
+        for name in set(self.engines.values()):
+            try:
+                ENGINES[name](**engine_args.get(name, {}))
+            except Exception as e:
+                log(f'Failed to create the {name} pp engine ({e}); '
+                    f'using the {FALLBACK_ENGINE} engine instead.', Ansi.LRED)
+
+                self.engines = {
+                    mode: FALLBACK_ENGINE if engine == name else engine
+                    for mode, engine in self.engines.items()
+                }
+
+        engine_args = {name: engine_args.get(name, {})
+                       for name in set(self.engines.values())}
+
+        self.pool = ProcessPoolExecutor(
+            max_workers = workers,
+            initializer = _init_worker,
+            initargs = (engine_args,)
+        )
+
+        self.slots = asyncio.Semaphore(max_queued)
+        self.timeout = timeout
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False)
+
+    async def calculate(self, jobs: list[DiffJob]) -> list[Optional[DifficultyAttrs]]:
+        """Calculate a batch of jobs in parallel; any job which
+        fails or times out has None in place of its result."""
+        return await asyncio.gather(*[self._submit(job) for job in jobs])
+
+    async def _submit(self, job: DiffJob) -> Optional[DifficultyAttrs]:
+        if (engine := self.engines.get(job.mode)) is None:
+            log(f'No pp engine for mode {job.mode}.', Ansi.LRED)
+            return
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            log('pp calculation queue is full.', Ansi.LRED)
+            return
+
+        try:
+            future = self.pool.submit(_difficulty, engine, job)
+        except Exception as e:
+            self.slots.release()
+            log(f'pp calculation failed ({engine}: {e}).', Ansi.LRED)
+            return
+
+        # a timed out job keeps running in its worker (only a job
+        # still queued can be cancelled), so its slot is only freed
+        # once it's actually finished, keeping `max_queued` honest.
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self.slots.release))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            log(f'pp calculation timed out ({engine}, {job.mode}, {job.mods}).', Ansi.LRED)
+        except Exception as e:
+            log(f'pp calculation failed ({engine}: {e}).', Ansi.LRED)
+
+class DifficultyStore:
+    """Difficulty attributes per (md5, mode, difficulty mods), in an
+    in-memory lru in front of mysql. A map's md5 & mods determine its
+    attributes entirely, so they're calculated once & kept forever.
+
+    Each engine's attributes are kept separately (and each version's,
+    past the first), so switching the engine for a mode (per `engines`)
+    or changing an engine doesn't serve the old ones.
+    """
+    __slots__ = ('db', 'engines', 'lru', 'db_hits', 'db_misses')
+
+    def __init__(self, db: AsyncSQLPool, engines: dict[int, str],
+                 max_size: int = 10000) -> None:
+        self.db = db
+        self.engines = engines
+        self.lru = TTLCache(max_size, ttl = float('inf'))
+        self.db_hits = self.db_misses = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self.lru.stats | {
+            'sql hits': self.db_hits, 'sql misses': self.db_misses
+        }
+
+    def _key(self, md5: str, mode: int, mods: int) -> tuple[str, int, int, str]:
+        engine = self.engines.get(mode, '')
+        if engine in ENGINES and (version := ENGINES[engine].version) > 1:
+            engine = f'{engine}.v{version}'
+
+        return (md5, mode, difficulty_mods(mods), engine)
+
+    async def get(self, md5: str, mode: int, mods: int) -> Optional[DifficultyAttrs]:
+        key = self._key(md5, mode, mods)
+
+        if attrs := self.lru.get(key):
+            return attrs
+
+        res = await self.db.fetch(
+            'SELECT sr, aim, speed, ar, od, max_combo, n_circles, '
+            'n_sliders, n_spinners FROM aika_difficulty '
+            'WHERE md5 = %s AND mode = %s AND mods = %s AND engine = %s',
+            [*key], _dict=False
+        )
+
+        if not res:
+            self.db_misses += 1
+            return
+
+        self.db_hits += 1
+
+        attrs = DifficultyAttrs(mode, *res)
+        self.lru.set(key, attrs)
+        return attrs
+
+    async def set(self, md5: str, mode: int, mods: int,
+                  attrs: DifficultyAttrs) -> None:
+        key = self._key(md5, mode, mods)
+        self.lru.set(key, attrs)
+
+        await self.db.execute(
+            'INSERT IGNORE INTO aika_difficulty (md5, mode, mods, engine, sr, '
+            'aim, speed, ar, od, max_combo, n_circles, n_sliders, n_spinners) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+            [*key, *attrs[1:]]
+        )
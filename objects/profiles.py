@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Iterable
+from typing import Optional
+from typing import Union
+
+from cmyui.mysql import AsyncSQLPool
+
+from objects.cache import TTLCache
+
+__all__ = ('ProfileCache', 'safe_name')
+
+Profile = dict[str, Union[int, str, None]] # {id, name, priv, clan}
+
+PROFILE_COLUMNS = (
+    'u.id, u.username name, u.privileges priv, c.tag clan '
+)
+
+def safe_name(name: str) -> str:
+    """A username as stored in users.username_safe."""
+    return name.strip().lower().replace(' ', '_')
+
+class ProfileCache:
+    """Akatsuki profiles (id, name, privileges & clan tag), cached by
+    osu! id for a short while; misses are loaded in a single query.
+
+    Usernames are resolved to ids the same way, by their safe form (so
+    case-insensitively); names which don't exist are remembered for
+    `negative_ttl` seconds, so repeated typos don't each cost a query.
+    """
+    __slots__ = ('lru', 'names', 'negative_ttl', 'db')
+
+    def __init__(self, db: AsyncSQLPool, max_size: int = 5000,
+                 ttl: float = 60, negative_ttl: float = 10) -> None:
+        self.db = db
+        self.lru = TTLCache(max_size, ttl) # {osu id: profile}
+        self.names = TTLCache(max_size, ttl) # {safe name: osu id (0 if none)}
+        self.negative_ttl = negative_ttl
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self.lru.stats | {
+            f'name {k}': v for k, v in self.names.stats.items()
+        }
+
+    async def get(self, osuID: int) -> Optional[Profile]:
+        return (await self.get_many([osuID])).get(osuID)
+
+    async def get_many(self, osuIDs: Iterable[int]) -> dict[int, Profile]:
+        """Return the profiles of each osu! id which exists."""
+        profiles = {}
+        missing = []
+
+        for osuID in osuIDs:
+            if profile := self.lru.get(osuID):
+                profiles[osuID] = profile
+            else:
+                missing.append(osuID)
+
+        if missing:
+            for row in await self.db.fetchall(
+                f'SELECT {PROFILE_COLUMNS}'
+                'FROM users u '
+                'LEFT JOIN clans c ON c.id = u.clan_id '
+                'WHERE u.id IN ({})'.format(', '.join(['%s'] * len(missing))),
+                missing
+            ):
+                profiles[row['id']] = self.set(row)
+
+        return profiles
+
+    async def get_by_name(self, username: str) -> Optional[Profile]:
+        return (await self.get_many_by_name([username])).get(safe_name(username))
+
+    async def get_many_by_name(self, usernames: Iterable[str]) -> dict[str, Profile]:
+        """Return the profiles of each username which exists,
+        by its safe name; unknown names are loaded in one query."""
+        ids = {}
+        missing = []
+
+        for name in map(safe_name, usernames):
+            if (osuID := self.names.get(name)) is None:
+                missing.append(name)
+            elif osuID:
+                ids[name] = osuID
+
+        profiles = {}
+
+        if missing:
+            rows = await self.db.fetchall(
+                f'SELECT u.username_safe, {PROFILE_COLUMNS}'
+                'FROM users u '
+                'LEFT JOIN clans c ON c.id = u.clan_id '
+                'WHERE u.username_safe IN ({})'.format(', '.join(['%s'] * len(missing))),
+                missing
+            )
+
+            for row in rows:
+                name = row.pop('username_safe')
+                self.names.set(name, row['id'])
+                profiles[name] = self.set(row)
+
+            for name in missing:
+                if name not in profiles:
+                    self.names.set(name, 0, ttl = self.negative_ttl)
+
+        if ids:
+            # names we knew; their profiles are probably cached too.
+            found = await self.get_many(ids.values())
+            profiles |= {name: found[osuID] for name, osuID in ids.items()
+                         if osuID in found}
+
+        return profiles
+
+    def set(self, profile: Profile) -> Profile:
+        self.lru.set(profile['id'], profile)
+        return profile
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+import random
+from typing import Optional
+
+from cmyui.mysql import AsyncSQLPool
+from sortedcontainers import SortedList
+
+from objects.xpbuffer import XPBuffer
+
+__all__ = ('RankIndex',)
+
+class RankIndex:
+    """An in-memory order-statistic index of users' xp per guild.
+
+    Each guild keeps its users in a SortedList of (-xp, discordid),
+    so a user's rank & the guild's top users are O(log n) lookups.
+
+    Users' xp summed across all guilds is materialized the same way
+    for the global leaderboard (so global ranks are O(log n) too), and
+    updated alongside the guild's.
+    """
+    __slots__ = ('xp', 'ranks', 'totals', 'global_ranks')
+
+    def __init__(self) -> None:
+        self.xp: dict[int, dict[int, int]] = {} # {guildid: {discordid: xp}}
+        self.ranks: dict[int, SortedList] = {} # {guildid: [(-xp, discordid), ...]}
+
+        self.totals: dict[int, int] = {} # {discordid: xp}
+        self.global_ranks = SortedList() # [(-xp, discordid), ...]
+
+    async def load(self, db: AsyncSQLPool) -> None:
+        self.xp.clear()
+        self.ranks.clear()
+
+        for row in await db.fetchall(
+            'SELECT discordid, guildid, xp '
+            'FROM aika_users WHERE xp > 0'
+        ):
+            self.xp.setdefault(row['guildid'], {})[row['discordid']] = row['xp']
+
+        for guildID, users in self.xp.items():
+            self.ranks[guildID] = SortedList(
+                (-xp, discordID) for discordID, xp in users.items()
+            )
+
+        totals: dict[int, int] = {}
+        for users in self.xp.values():
+            for discordID, xp in users.items():
+                totals[discordID] = totals.get(discordID, 0) + xp
+
+        self.totals = totals
+        self.global_ranks = SortedList(
+            (-xp, discordID) for discordID, xp in totals.items()
+        )
+
+    def get(self, discordID: int, guildID: int) -> int:
+        return self.xp.get(guildID, {}).get(discordID, 0)
+
+    def set(self, discordID: int, guildID: int, xp: int) -> None:
+        users = self.xp.setdefault(guildID, {})
+        ranks = self.ranks.setdefault(guildID, SortedList())
+
+        if (old := users.pop(discordID, None)) is not None:
+            ranks.remove((-old, discordID))
+
+        if xp > 0:
+            users[discordID] = xp
+            ranks.add((-xp, discordID))
+
+        if delta := max(xp, 0) - (old or 0):
+            self._set_total(discordID, self.totals.get(discordID, 0) + delta)
+
+    def _set_total(self, discordID: int, xp: int) -> None:
+        if (old := self.totals.pop(discordID, None)) is not None:
+            self.global_ranks.remove((-old, discordID))
+
+        if xp > 0:
+            self.totals[discordID] = xp
+            self.global_ranks.add((-xp, discordID))
+
+    def add(self, discordID: int, guildID: int, xp: int) -> None:
+        self.set(discordID, guildID, self.get(discordID, guildID) + xp)
+
+    def rank(self, guildID: int, xp: int) -> int:
+        """Return the rank a given amount of xp would have in a guild."""
+        if not (ranks := self.ranks.get(guildID)):
+            return 1
+
+        # (-xp,) sorts before any (-xp, discordid),
+        # so this is the number of users with more xp.
+        return ranks.bisect_left((-xp,)) + 1
+
+    def top(self, guildID: int, n: int,
+            offset: int = 0) -> list[tuple[int, int]]:
+        """Return `n` users of a guild from `offset` onwards,
+        ordered by xp descending as [(discordid, xp), ...]."""
+        if not (ranks := self.ranks.get(guildID)):
+            return []
+
+        return [(discordID, -xp) for xp, discordID
+                in ranks.islice(offset, offset + n)]
+
+    def global_rank(self, discordID: int) -> Optional[int]:
+        """Return a user's rank by their xp across all guilds."""
+        if not (xp := self.totals.get(discordID)):
+            return None
+
+        return self.global_ranks.bisect_left((-xp,)) + 1
+
+    def global_top(self, n: int, offset: int = 0) -> list[tuple[int, int]]:
+        """Return `n` users from `offset` onwards, ordered by their
+        xp across all guilds as [(discordid, xp), ...]."""
+        return [(discordID, -xp) for xp, discordID
+                in self.global_ranks.islice(offset, offset + n)]
+
+    async def reconcile(self, db: AsyncSQLPool, buffer: XPBuffer) -> int:
+        """Check the global totals against sql's, correcting any users
+        which have drifted in place; returns how many had drifted."""
+        # with flushes paused, sql's totals plus the xp
+        # buffered since are exactly what we should have.
+        async with buffer.paused():
+            rows = await db.fetchall(
+                'SELECT discordid, SUM(xp) xp FROM aika_users '
+                'WHERE xp > 0 GROUP BY discordid'
+            )
+
+            totals = {row['discordid']: int(row['xp']) for row in rows}
+            for (discordID, _), xp in buffer.xp.items():
+                totals[discordID] = totals.get(discordID, 0) + xp
+
+        drifted = [discordID for discordID in totals.keys() | self.totals.keys()
+                   if totals.get(discordID, 0) != self.totals.get(discordID, 0)]
+
+        # usually few (or no) users, so update them
+        # individually rather than rebuilding the list.
+        for discordID in drifted:
+            self._set_total(discordID, totals.get(discordID, 0))
+
+        return len(drifted)
+
+    async def verify(self, db: AsyncSQLPool, buffer: XPBuffer,
+                     sample: int = 50) -> list[dict[str, int]]:
+        """Compare the index against sql for a random sample of users,
+        returning any mismatches (in terms of sql's xp & ranks)."""
+        users = [(discordID, guildID)
+                 for guildID, members in self.xp.items()
+                 for discordID in members]
+
+        mismatches = []
+
+        # with flushes paused, sql holds exactly the index's xp less
+        # what's buffered, no matter what's gained while we check.
+        async with buffer.paused():
+            for discordID, guildID in random.sample(users, min(sample, len(users))):
+                res = await db.fetch(
+                    'SELECT u.xp, (SELECT COUNT(*) + 1 FROM aika_users '
+                    'WHERE guildid = u.guildid AND xp > u.xp) r '
+                    'FROM aika_users u WHERE u.discordid = %s AND u.guildid = %s',
+                    [discordID, guildID]
+                )
+
+                sql_xp, sql_rank = (res['xp'], res['r']) if res else (0, None)
+                xp, rank = self._sql_rank(discordID, guildID, buffer)
+
+                if sql_xp != xp or sql_rank != rank:
+                    mismatches.append({
+                        'discordid': discordID, 'guildid': guildID,
+                        'xp': xp, 'rank': rank,
+                        'sql_xp': sql_xp, 'sql_rank': sql_rank
+                    })
+
+        return mismatches
+
+    def _sql_rank(self, discordID: int, guildID: int,
+                  buffer: XPBuffer) -> tuple[int, Optional[int]]:
+        """Return the xp & rank sql should have for a user, i.e. the
+        index's without the buffered xp (rank None if no xp at all)."""
+        if (xp := self.get(discordID, guildID) - buffer.xp.get((discordID, guildID), 0)) <= 0:
+            return xp, None
+
+        # users with more xp in the index, less anyone
+        # who only has more because of their buffered xp.
+        rank = self.rank(guildID, xp)
+        for (userID, userGuildID), pending in buffer.xp.items():
+            if userGuildID == guildID and xp < self.get(userID, guildID) <= xp + pending:
+                rank -= 1
+
+        return xp, rank
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Union
+
+import discord
+from cmyui.mysql import AsyncSQLPool
+
+from objects.cache import SingleFlight
+from objects.cache import TTLCache
+
+__all__ = ('RenderCache',)
+
+# (osu! id, mode, rx, command)
+RenderKey = tuple[int, int, bool, str]
+Rendered = Union[discord.Embed, str]
+
+class RenderCache:
+    """Rendered score command embeds, keyed by (osu! id, mode, rx,
+    command), each tagged with the user's newest score id at the time.
+
+    Every request probes the user's newest score id (an indexed MAX(id)),
+    and re-renders only if it's changed; concurrent re-renders of the
+    same key share a single render. Only embeds are kept, as dicts, so
+    each caller gets its own copy to modify. Entries also expire after
+    `ttl` seconds, to pick up changes other than new scores (names,
+    clan tags, map statuses).
+    """
+    __slots__ = ('db', 'lru', 'renders', 'stale')
+
+    def __init__(self, db: AsyncSQLPool, max_size: int = 1000,
+                 ttl: float = 600.0) -> None:
+        self.db = db
+        self.lru = TTLCache(max_size, ttl)
+        self.renders = SingleFlight()
+        self.stale = 0 # entries outdated by a new score
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self.lru.stats | {'stale': self.stale}
+
+    async def newest_score(self, osuID: int, mode: int, rx: bool) -> int:
+        table = 'scores_relax' if rx else 'scores'
+        res = await self.db.fetch(
+            f'SELECT MAX(id) FROM {table} '
+            'WHERE userid = %s AND play_mode = %s',
+            [osuID, mode], _dict=False
+        )
+
+        return (res[0] or 0) if res else 0
+
+    async def get(self, key: RenderKey, render: Callable[..., Awaitable[Rendered]],
+                  *args) -> Rendered:
+        """Return the cached render for `key` if the user has set no
+        scores since; otherwise, `render(*args)` & cache the result."""
+        osuID, mode, rx, _ = key
+        newest = await self.newest_score(osuID, mode, rx)
+
+        if entry := self.lru.get(key):
+            if entry[0] == newest:
+                return discord.Embed.from_dict(entry[1])
+
+            self.stale += 1
+
+        res = await self.renders.do((key, newest), self._render,
+                                    key, newest, render, *args)
+
+        if isinstance(res, discord.Embed):
+            # this one's shared between concurrent callers.
+            return discord.Embed.from_dict(res.to_dict())
+
+        return res
+
+    async def _render(self, key: RenderKey, newest: int,
+                      render: Callable[..., Awaitable[Rendered]],
+                      *args) -> Rendered:
+        res = await render(*args)
+
+        # strings are errors (or users without scores),
+        # which are cheap, or may not last; don't keep them.
+        if isinstance(res, discord.Embed):
+            self.lru.set(key, (newest, res.to_dict()))
+
+        return res
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from typing import NamedTuple
+from typing import Optional
+from typing import Union
+
+import discord
+from cmyui.logging import Ansi
+from cmyui.logging import log
+
+__all__ = ('RoleChange', 'RoleSync')
+
+class RoleChange(NamedTuple):
+    member: discord.Member
+    role: discord.Role
+    add: bool
+
+    def __str__(self) -> str:
+        action = 'Adding' if self.add else 'Removing'
+        return f"{action} {self.member}'s {self.role.name.lower()}."
+
+class RoleSync:
+    """Brings roles' members in line with who should have them.
+
+    The changes needed are found by comparing the desired & actual sets
+    of members for each role, and applied with at most `concurrency`
+    requests in flight (discord.py waits out each route's rate limits).
+    The results of the last (real, not dry) run are kept in `last_run`.
+    """
+    __slots__ = ('concurrency', 'last_run')
+
+    def __init__(self, concurrency: int = 4) -> None:
+        self.concurrency = concurrency
+        self.last_run: Optional[dict[str, Union[int, float]]] = None
+
+    @staticmethod
+    def plan(guild: discord.Guild,
+             desired: dict[Optional[discord.Role], set[int]]) -> list[RoleChange]:
+        """The role changes needed for each role to have exactly
+        the desired members (by id) who are in the guild; roles
+        which don't exist (None) are skipped."""
+        changes = []
+
+        for role, wanted in desired.items():
+            if role is None:
+                continue
+
+            actual = {m.id for m in role.members}
+
+            for discordID in actual - wanted:
+                if member := guild.get_member(discordID):
+                    changes.append(RoleChange(member, role, False))
+
+            for discordID in wanted - actual:
+                if member := guild.get_member(discordID):
+                    changes.append(RoleChange(member, role, True))
+
+        return changes
+
+    async def apply(self, changes: list[RoleChange], dry_run: bool = False,
+                    reason: Optional[str] = None) -> dict[str, Union[int, float]]:
+        start = time.perf_counter()
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def apply_change(change: RoleChange) -> bool:
+            log(str(change), Ansi.LYELLOW)
+
+            if dry_run:
+                return True
+
+            if change.add:
+                func = change.member.add_roles
+            else:
+                func = change.member.remove_roles
+
+            async with limit:
+                try:
+                    await func(change.role, reason=reason)
+                except discord.HTTPException as e:
+                    log(f'Failed to update {change.member} ({e}).', Ansi.LRED)
+                    return False
+
+            return True
+
+        results = await asyncio.gather(*[apply_change(c) for c in changes])
+
+        stats = {
+            'adds': sum(c.add for c in changes),
+            'removes': sum(not c.add for c in changes),
+            'failures': results.count(False),
+            'duration': time.perf_counter() - start,
+            'dry run': dry_run
+        }
+
+        if not dry_run:
+            self.last_run = stats
+
+        return stats
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Container
+from typing import Optional
+from typing import Union
+
+from cmyui.mysql import AsyncSQLPool
+
+__all__ = ('ScoreWatcher',)
+
+TABLES = ('scores', 'scores_relax') # indexed by rx
+
+SCORE_COLUMNS = (
+    's.id, s.userid, s.score, s.pp, s.accuracy acc, s.max_combo s_combo, '
+    's.mods, s.300_count n300, s.100_count n100, s.50_count n50, '
+    's.misses_count nmiss, s.time, s.completed, s.play_mode, '
+    's.beatmap_md5, b.ranked '
+)
+
+Score = dict[str, Union[int, float, str]]
+
+class ScoreWatcher:
+    """Finds new scores by watching each scores table's ids.
+
+    Each poll reads only the rows past the last id seen in each table
+    (in one query, by primary key), so the cost follows the number of
+    new scores, rather than how many users are being watched. The ids
+    seen only become the new watermarks once `commit` is called (after
+    the scores are dealt with), so a failed poll's scores are retried.
+    """
+    __slots__ = ('db', 'batch_size', 'watermarks', 'pending')
+
+    def __init__(self, db: AsyncSQLPool, batch_size: int = 1000) -> None:
+        self.db = db
+        self.batch_size = batch_size # max rows per table, per poll
+        self.watermarks: Optional[list[int]] = None # per table, by rx
+        self.pending: Optional[list[int]] = None # from the last poll
+
+    async def poll(self, users: Container[int]) -> list[tuple[bool, Score]]:
+        """Return (rx, score) for each new best score on a ranked
+        osu!/osu!taiko map, set by one of `users` (osu! ids)."""
+        if self.watermarks is None:
+            # start from now; scores set while we were
+            # offline are long gone from anyone's mind.
+            self.watermarks = [
+                (await self.db.fetch(
+                    f'SELECT MAX(id) FROM {table}', _dict=False
+                ))[0] or 0 for table in TABLES
+            ]
+            return []
+
+        rows = await self.db.fetchall(
+            ' UNION ALL '.join([
+                f'(SELECT {rx} rx, {SCORE_COLUMNS}'
+                f'FROM {table} s '
+                'LEFT JOIN beatmaps b USING(beatmap_md5) '
+                'WHERE s.id > %s ORDER BY s.id LIMIT %s)'
+                for rx, table in enumerate(TABLES)
+            ]),
+            [x for wm in self.watermarks for x in (wm, self.batch_size)]
+        )
+
+        scores = []
+        self.pending = self.watermarks.copy()
+
+        for row in rows:
+            rx = row.pop('rx')
+            self.pending[rx] = max(self.pending[rx], row['id'])
+
+            if (
+                row['userid'] in users and
+                row['completed'] == 3 and
+                row['ranked'] in (2, 3) and
+                row['play_mode'] in range(2)
+            ):
+                scores.append((bool(rx), row))
+
+        return scores
+
+    def commit(self) -> None:
+        """Move past the scores returned by the last poll."""
+        if self.pending is not None:
+            self.watermarks, self.pending = self.pending, None
+
+    async def notable(self, scores: list[tuple[bool, Score]]) -> list[tuple[bool, Score, str]]:
+        """Return (rx, score, kind) for each of `scores` which is either
+        a new #1 on its map, or a new top play for its player."""
+        notable = []
+
+        for rx, table in enumerate(TABLES):
+            if not (rows := [row for _rx, row in scores if _rx == rx]):
+                continue
+
+            # relax leaderboards are sorted by pp, rather than score.
+            sort = 'pp' if rx else 'score'
+            ids = [row['id'] for row in rows]
+            id_list = ', '.join(['%s'] * len(ids))
+
+            maps = {(r['beatmap_md5'], r['play_mode']) for r in rows}
+            map_bests = {
+                (r['beatmap_md5'], r['play_mode']): r['best']
+                for r in await self.db.fetchall(
+                    f'SELECT s.beatmap_md5, s.play_mode, MAX(s.{sort}) best '
+                    f'FROM {table} s INNER JOIN users u ON u.id = s.userid '
+                    'WHERE s.completed = 3 AND u.privileges & 1 '
+                    'AND (s.beatmap_md5, s.play_mode) IN ({}) '
+                    'AND s.id NOT IN ({}) '
+                    'GROUP BY s.beatmap_md5, s.play_mode'.format(
+                        ', '.join(['(%s, %s)'] * len(maps)), id_list),
+                    [*(x for key in maps for x in key), *ids]
+                )
+            }
+
+            users = {(r['userid'], r['play_mode']) for r in rows}
+            user_bests = {
+                (r['userid'], r['play_mode']): r['best']
+                for r in await self.db.fetchall(
+                    f'SELECT userid, play_mode, MAX(pp) best FROM {table} '
+                    'WHERE completed = 3 AND (userid, play_mode) IN ({}) '
+                    'AND id NOT IN ({}) '
+                    'GROUP BY userid, play_mode'.format(
+                        ', '.join(['(%s, %s)'] * len(users)), id_list),
+                    [*(x for key in users for x in key), *ids]
+                )
+            }
+
+            # the bests above exclude all of the new scores, so only the
+            # best new score on a map (or by a player) can be its new
+            # #1 (or their new top play); ties go to the earliest.
+            map_tops, user_tops = {}, {}
+            for row in rows:
+                map_key = (row['beatmap_md5'], row['play_mode'])
+                if map_key not in map_tops or row[sort] > map_tops[map_key][sort]:
+                    map_tops[map_key] = row
+
+                user_key = (row['userid'], row['play_mode'])
+                if user_key not in user_tops or row['pp'] > user_tops[user_key]['pp']:
+                    user_tops[user_key] = row
+
+            for row in rows:
+                map_key = (row['beatmap_md5'], row['play_mode'])
+                user_key = (row['userid'], row['play_mode'])
+
+                if row is map_tops[map_key] and row[sort] > map_bests.get(map_key, 0):
+                    notable.append((bool(rx), row, '#1'))
+                elif row is user_tops[user_key] and row['pp'] > user_bests.get(user_key, 0):
+                    notable.append((bool(rx), row, 'top play'))
+
+        return notable
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from typing import Optional
+
+import discord
+
+__all__ = ('VoiceTracker',)
+
+Key = tuple[int, int] # (discordid, guildid)
+
+class VoiceSession:
+    __slots__ = ('channelid', 'multiplier', 'since', 'accrued')
+
+    def __init__(self, channelid: Optional[int],
+                 multiplier: float, since: float) -> None:
+        self.channelid = channelid
+        self.multiplier = multiplier
+        self.since = since
+        self.accrued = 0.0 # seconds, weighted by multiplier
+
+class VoiceTracker:
+    """Tracks users' time spent in voice from state transitions.
+
+    Each member has a session which accrues seconds (weighted by their
+    current multiplier) while they share a channel with someone else;
+    only the members of a channel whose state changed are touched, so
+    the cost scales with the number of transitions, not members.
+    """
+    __slots__ = ('sessions', 'channels')
+
+    def __init__(self) -> None:
+        self.sessions: dict[Key, VoiceSession] = {}
+        self.channels: dict[int, set[Key]] = {} # {channelid: {(discordid, guildid), ...}}
+
+    @staticmethod
+    def multiplier(state: discord.VoiceState) -> float:
+        if state.self_deaf: # Deafened gives no xp
+            return 0.0
+
+        multiplier = 1.0
+        if state.self_video:
+            multiplier *= 1.5
+        if state.self_stream:
+            multiplier *= 1.25
+        if state.self_mute:
+            multiplier /= 2
+
+        return multiplier
+
+    def update(self, discordID: int, guildID: int,
+               state: Optional[discord.VoiceState], now: float) -> None:
+        """Record a member's new voice state (None if they've left)."""
+        key = (discordID, guildID)
+
+        if (
+            state is None or state.channel is None or
+            state.channel == state.channel.guild.afk_channel
+        ): # the afk channel doesn't count as being in voice
+            channelID, multiplier = None, 0.0
+        else:
+            channelID, multiplier = state.channel.id, self.multiplier(state)
+
+        if not (session := self.sessions.get(key)):
+            if channelID is None:
+                return
+
+            session = self.sessions[key] = VoiceSession(None, 0.0, now)
+
+        old_channelID = session.channelid
+
+        # bring everyone affected by this transition up to date
+        # before anything changes, as the number of members in a
+        # channel decides whether any of them accrue time.
+        for c in {old_channelID, channelID} - {None}:
+            self._settle(c, now)
+
+        if old_channelID is not None:
+            self.channels[old_channelID].discard(key)
+
+            if not self.channels[old_channelID]:
+                del self.channels[old_channelID]
+
+        if channelID is not None:
+            self.channels.setdefault(channelID, set()).add(key)
+
+        session.channelid = channelID
+        session.multiplier = multiplier
+        session.since = now
+
+    def _settle(self, channelID: int, now: float) -> None:
+        members = self.channels.get(channelID, ())
+        eligible = len(members) >= 2 # need someone to talk to
+
+        for key in members:
+            session = self.sessions[key]
+
+            if eligible:
+                session.accrued += (now - session.since) * session.multiplier
+
+            session.since = now
+
+    def collect(self, interval: float, now: float) -> list[tuple[int, int, int]]:
+        """Return [(discordid, guildid, intervals), ...] for each member
+        who has accrued at least one full `interval` of voice time."""
+        for channelID in self.channels:
+            self._settle(channelID, now)
+
+        ret = []
+
+        for key, session in tuple(self.sessions.items()):
+            if intervals := int(session.accrued // interval):
+                session.accrued -= intervals * interval
+                ret.append((*key, intervals))
+
+            if session.channelid is None:
+                # they've left voice; drop any leftover time.
+                del self.sessions[key]
+
+        return ret
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+import traceback
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from cmyui.logging import Ansi
+from cmyui.logging import log
+from cmyui.mysql import AsyncSQLPool
+
+__all__ = ('XPBuffer',)
+
+Key = tuple[int, int] # (discordid, guildid)
+
+class XPBuffer:
+    """A write-behind accumulator for xp gained by users.
+
+    XP deltas & cooldown stamps are held in memory per (discordid,
+    guildid), and written to aika_users in a single multi-row upsert
+    whenever the buffer is flushed (on a timer, once it's half full,
+    and on shutdown). After a failed flush, early flushes are held off
+    for `backoff` seconds, leaving retries to the timer.
+
+    `max_size` is a hard cap; once it's reached (i.e. sql has been down
+    for a while), cooldown stamps are dropped first, as they're also
+    held in memory & only matter across restarts. After that, xp for
+    users already buffered is still merged into their entries, but xp
+    for anyone else is dropped (and add() returns False).
+    """
+    __slots__ = ('db', 'max_size', 'backoff', 'xp', 'last_xp', 'lock',
+                 'retry_at', 'dropped_xp', 'dropped_cooldowns', '_flush_task')
+
+    def __init__(self, db: AsyncSQLPool, max_size: int = 1000,
+                 backoff: float = 30.0) -> None:
+        self.db = db
+        self.max_size = max_size
+        self.backoff = backoff
+
+        self.xp: dict[Key, int] = {}
+        self.last_xp: dict[Key, int] = {}
+
+        # held while writing, so there's only one write in flight.
+        self.lock = asyncio.Lock()
+        self.retry_at = 0.0 # no early flushes until then (monotonic)
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # dropped since the last successful flush.
+        self.dropped_xp = 0
+        self.dropped_cooldowns = 0
+
+    def __len__(self) -> int:
+        # users with both xp & a cooldown are counted twice, which
+        # is fine for capping the buffer, & keeps add() O(1).
+        return len(self.xp) + len(self.last_xp)
+
+    def add(self, discordID: int, guildID: int, xp: int,
+            last_xp: Optional[int] = None) -> bool:
+        """Buffer `xp` (and optionally a new cooldown) for a user;
+        returns False if the buffer's full & the xp was dropped."""
+        key = (discordID, guildID)
+
+        if len(self) >= self.max_size and self.last_xp:
+            self.dropped_cooldowns += len(self.last_xp)
+            self.last_xp.clear()
+
+        if key not in self.xp and len(self) >= self.max_size:
+            self.dropped_xp += xp
+            return False
+
+        self.xp[key] = self.xp.get(key, 0) + xp
+
+        if last_xp is not None and (
+            key in self.last_xp or len(self) < self.max_size
+        ):
+            self.last_xp[key] = last_xp
+
+        if len(self) >= self.max_size // 2:
+            # buffer's filling up, write it out early.
+            self.schedule_flush()
+
+        return True
+
+    def discard(self, discordID: int, guildID: int) -> None:
+        """Drop any buffered xp for a user (e.g. their xp was set)."""
+        self.xp.pop((discordID, guildID), None)
+
+    def schedule_flush(self) -> None:
+        if self._flush_task and not self._flush_task.done():
+            return # already flushing
+
+        if time.monotonic() < self.retry_at:
+            return # the last flush failed, leave it to the timer
+
+        self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> bool:
+        """Write the buffered xp to sql; on failure, it's kept
+        for the next flush (so this never raises, and periodic
+        flushes keep going), and False is returned."""
+        async with self.lock:
+            return await self._flush()
+
+    @asynccontextmanager
+    async def paused(self) -> AsyncIterator[None]:
+        """Flush, then hold off any further flushes until exiting;
+        while paused, sql holds exactly the xp not in `self.xp`."""
+        async with self.lock:
+            await self._flush()
+            yield
+
+    async def _flush(self) -> bool:
+        if not (self.xp or self.last_xp):
+            return True
+
+        # swap out the buffers before awaiting so that
+        # anything gained during the write is kept.
+        xp, self.xp = self.xp, {}
+        last_xp, self.last_xp = self.last_xp, {}
+
+        params = []
+        for key in xp.keys() | last_xp.keys():
+            params.extend((*key, xp.get(key, 0), last_xp.get(key, 0)))
+
+        try:
+            await self.db.execute(
+                'INSERT INTO aika_users (discordid, guildid, xp, last_xp) '
+                'VALUES {} ON DUPLICATE KEY UPDATE xp = xp + VALUES(xp), '
+                'last_xp = GREATEST(last_xp, VALUES(last_xp))'.format(
+                    ', '.join(['(%s, %s, %s, %s)'] * (len(params) // 4))
+                ), params
+            )
+        except Exception:
+            # put everything back so it's retried on the next flush.
+            for key, v in xp.items():
+                self.xp[key] = self.xp.get(key, 0) + v
+
+            for key, v in last_xp.items():
+                self.last_xp[key] = max(v, self.last_xp.get(key, 0))
+
+            self.retry_at = time.monotonic() + self.backoff
+
+            log(f'Failed to flush xp for {len(params) // 4} users.', Ansi.LRED)
+            traceback.print_exc()
+            return False
+
+        self.retry_at = 0.0
+
+        if self.dropped_xp or self.dropped_cooldowns:
+            log(f'Dropped {self.dropped_xp}xp & {self.dropped_cooldowns} '
+                'cooldowns while the xp buffer was full.', Ansi.LYELLOW)
+            self.dropped_xp = self.dropped_cooldowns = 0
+
+        return True
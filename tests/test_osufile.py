@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import pytest
+
+from objects.osufile import parse_metadata
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'bench', 'fixtures')
+
+# the maps in bench/fixtures/ aren't on the osu!api, so their max combos
+# are oppai-ng 4.1.0's, and their lengths & bpms were worked out by hand
+# from their timing points, first & last objects, and breaks.
+with open(os.path.join(FIXTURES, 'metadata.json')) as f:
+    EXPECTED = json.load(f)
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_parse_metadata(name: str) -> None:
+    with open(os.path.join(FIXTURES, f'{name}.osu'), 'rb') as f:
+        meta = parse_metadata(f.read())
+
+    assert meta is not None
+    assert meta['max_combo'] == EXPECTED[name]['max_combo']
+    assert meta['hit_length'] == EXPECTED[name]['hit_length']
+    assert meta['bpm'] == EXPECTED[name]['bpm']
+
+def test_no_beatmap_id() -> None:
+    # old maps have no ids, which the osu!api's metadata needs.
+    with open(os.path.join(FIXTURES, 'streams.osu'), 'rb') as f:
+        content = f.read()
+
+    assert parse_metadata(content.replace(b'BeatmapID:1', b'BeatmapID:0')) is None
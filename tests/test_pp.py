@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from cmyui.osu.mods import Mods
+
+from objects.difficulty import DifficultyAttrs
+from objects.pp import calc_pp
+
+# difficulty attributes & pp (for a few accuracies & miss counts)
+# given by oppai-ng 4.1.0, for the maps in bench/fixtures/ (reinflaw.osu
+# is rosu-pp-py's test map; the others were generated for these).
+# (mods, attrs, [(acc, nmiss, pp), ...])
+OPPAI = [
+    # reinflaw.osu, osu!
+    (0, DifficultyAttrs(0, 3.5438, 1.5961, 1.8305, 9.3, 8.8, 51, 43, 4, 0), [
+        (100, 0, 83.7185), (97.5, 1, 58.7493), (92, 4, 20.7199), (70, 10, 0.7854)
+    ]),
+    (Mods.HIDDEN, DifficultyAttrs(0, 3.5438, 1.5961, 1.8305, 9.3, 8.8, 51, 43, 4, 0), [
+        (100, 0, 91.4433), (97.5, 1, 64.3612), (92, 4, 22.8427), (70, 10, 0.8701)
+    ]),
+    (Mods.DOUBLETIME, DifficultyAttrs(0, 4.7465, 2.0895, 2.4679, 10.5333, 10.3333, 51, 43, 4, 0), [
+        (100, 0, 181.7134), (97.5, 1, 132.4071), (92, 4, 51.2357), (70, 10, 2.3816)
+    ]),
+    (Mods.NOFAIL, DifficultyAttrs(0, 3.5438, 1.5961, 1.8305, 9.3, 8.8, 51, 43, 4, 0), [
+        (100, 0, 83.7185)
+    ]),
+    (Mods.EASY | Mods.HALFTIME, DifficultyAttrs(0, 2.7271, 1.1071, 1.449, 1.2, 1.5556, 51, 43, 4, 0), [
+        (100, 0, 17.2177), (97.5, 1, 14.2546), (92, 4, 6.552), (70, 10, 0.2783)
+    ]),
+    # streams.osu, osu!
+    (0, DifficultyAttrs(0, 4.681, 2.3884, 2.1969, 9.4, 8.5, 315, 169, 50, 1), [
+        (100, 0, 154.5175), (97.5, 1, 113.2364), (92, 4, 73.5585), (70, 10, 23.992)
+    ]),
+    (Mods.HIDDEN | Mods.HARDROCK, DifficultyAttrs(0, 5.0536, 2.6224, 2.2399, 10.0, 10.0, 315, 169, 50, 1), [
+        (100, 0, 248.9348), (97.5, 1, 170.4967), (92, 4, 103.9278), (70, 10, 35.5268)
+    ]),
+    (Mods.DOUBLETIME, DifficultyAttrs(0, 6.3427, 3.173, 3.1664, 10.6, 10.1111, 315, 169, 50, 1), [
+        (100, 0, 384.5498), (97.5, 1, 299.2769), (92, 4, 207.8443), (70, 10, 71.8054)
+    ]),
+    (Mods.FLASHLIGHT, DifficultyAttrs(0, 4.681, 2.3884, 2.1969, 9.4, 8.5, 315, 169, 50, 1), [
+        (100, 0, 175.4029), (97.5, 1, 132.6858), (92, 4, 89.4273), (70, 10, 30.4693)
+    ]),
+    (Mods.SPUNOUT, DifficultyAttrs(0, 4.681, 2.3884, 2.1969, 9.4, 8.5, 315, 169, 50, 1), [
+        (100, 0, 152.9402), (97.5, 1, 112.0804), (92, 4, 72.8077), (70, 10, 23.7471)
+    ]),
+    # jumps.osu, osu!
+    (0, DifficultyAttrs(0, 4.3905, 2.2752, 1.9553, 8.6, 7.0, 206, 119, 34, 7), [
+        (100, 0, 101.3947), (97.5, 1, 78.4959), (92, 4, 52.4884), (70, 10, 14.1134)
+    ]),
+    (Mods.HARDROCK, DifficultyAttrs(0, 4.6806, 2.4644, 1.9681, 10.0, 9.8333, 206, 119, 34, 7), [
+        (100, 0, 183.9829), (97.5, 1, 120.157), (92, 4, 69.345), (70, 10, 19.0146)
+    ]),
+    (Mods.HIDDEN | Mods.DOUBLETIME, DifficultyAttrs(0, 5.6032, 2.8647, 2.6122, 10.0667, 9.1111, 206, 119, 34, 7), [
+        (100, 0, 250.5789), (97.5, 1, 192.073), (92, 4, 127.9322), (70, 10, 34.8324)
+    ]),
+    # drums.osu, taiko
+    (0, DifficultyAttrs(1, 4.7653, 0.0, 4.7653, 5.0, 6.5, 265, 265, 19, 16), [
+        (100, 0, 185.3359), (97.5, 1, 156.651), (92, 4, 115.4256), (70, 10, 65.43)
+    ]),
+    (Mods.HIDDEN, DifficultyAttrs(1, 4.7653, 0.0, 4.7653, 5.0, 6.5, 265, 265, 19, 16), [
+        (100, 0, 206.8197), (97.5, 1, 175.1751), (92, 4, 129.5662), (70, 10, 73.7657)
+    ]),
+    (Mods.HARDROCK, DifficultyAttrs(1, 4.7653, 0.0, 4.7653, 7.0, 9.3333, 265, 265, 19, 16), [
+        (100, 0, 217.4106), (97.5, 1, 178.3376), (92, 4, 124.0768), (70, 10, 65.5297)
+    ]),
+    (Mods.DOUBLETIME, DifficultyAttrs(1, 6.1817, 0.0, 6.1817, 7.6667, 10.0, 265, 265, 19, 16), [
+        (100, 0, 302.5823), (97.5, 1, 257.3676), (92, 4, 191.8098), (70, 10, 110.1428)
+    ]),
+    (Mods.NOFAIL, DifficultyAttrs(1, 4.7653, 0.0, 4.7653, 5.0, 6.5, 265, 265, 19, 16), [
+        (100, 0, 166.8023)
+    ]),
+    # reinflaw.osu, taiko
+    (0, DifficultyAttrs(1, 2.6845, 0.0, 2.6845, 9.3, 8.8, 51, 43, 4, 0), [
+        (100, 0, 98.3857), (97.5, 1, 72.4623), (92, 4, 45.4182), (70, 10, 16.6038)
+    ]),
+    (Mods.HIDDEN | Mods.DOUBLETIME, DifficultyAttrs(1, 3.0514, 0.0, 3.0514, 10.5333, 11.5556, 51, 43, 4, 0), [
+        (100, 0, 160.8186), (97.5, 1, 116.5988), (92, 4, 71.0987), (70, 10, 24.2532)
+    ]),
+    (Mods.EASY, DifficultyAttrs(1, 2.6845, 0.0, 2.6845, 4.65, 4.6667, 51, 43, 4, 0), [
+        (100, 0, 72.6709), (97.5, 1, 56.2982), (92, 4, 38.2427), (70, 10, 16.5271)
+    ]),
+]
+
+@pytest.mark.parametrize(
+    'mods, attrs, acc, nmiss, expected',
+    [(mods, attrs, *play) for mods, attrs, plays in OPPAI for play in plays]
+)
+def test_calc_pp(mods: int, attrs: DifficultyAttrs, acc: float,
+                 nmiss: int, expected: float) -> None:
+    assert calc_pp(attrs, mods, acc, nmiss = nmiss) == pytest.approx(expected, rel = 1e-3)
+
+@pytest.mark.parametrize('nmiss', (1, 4, 10))
+def test_nofail_misses(nmiss: int) -> None:
+    # oppai-ng takes 20% off per miss here, where osu! takes 2%.
+    attrs = OPPAI[0][1]
+    nf = calc_pp(attrs, Mods.NOFAIL, 97.5, nmiss = nmiss)
+    nm = calc_pp(attrs, 0, 97.5, nmiss = nmiss)
+
+    assert nf / nm == pytest.approx(max(0.9, 1.0 - 0.02 * nmiss))
@@ -150,6 +150,30 @@ def isfloat(s: str) -> bool: # obviously not made for safety
 def try_parse_float(s: str) -> Optional[float]:
     return float(s) if isfloat(s) else None
 
+MOD_ACRONYMS = {
+    'nf': Mods.NOFAIL, 'ez': Mods.EASY, 'hd': Mods.HIDDEN,
+    'hr': Mods.HARDROCK, 'dt': Mods.DOUBLETIME, 'ht': Mods.HALFTIME,
+    'nc': Mods.NIGHTCORE | Mods.DOUBLETIME, 'fl': Mods.FLASHLIGHT,
+    'so': Mods.SPUNOUT
+}
+
+def mods_from_str(s: str) -> Optional[int]:
+    """Parse a mod string like "HDDT" (or "nm"); returns
+    None if it contains anything we don't recognize."""
+    if (s := s.lower()) == 'nm':
+        return 0
+
+    if len(s) % 2:
+        return
+
+    mods = 0
+    for i in range(0, len(s), 2):
+        if (acronym := s[i:i + 2]) not in MOD_ACRONYMS:
+            return
+        mods |= MOD_ACRONYMS[acronym]
+
+    return mods
+
 def asciify(s: str) -> str:
     return s.encode('ascii', 'ignore').decode('ascii')
 